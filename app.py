@@ -1,158 +1,313 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, g, Response
 import re
 import json
+import click
 import os
 from flask_session import Session
-# import supabase
-from supabase import create_client
 import config
-from werkzeug.security import generate_password_hash, check_password_hash
 import requests
-import cv2
-import numpy as np
-import sqlite3
-from datetime import datetime, timedelta
 from email_validator import validate_email, EmailNotValidError
-# SupabaseException is not available in supabase 2.4.0, using generic Exception instead
-from gotrue.errors import AuthApiError
 import time
+import threading
 from dotenv import load_dotenv
+import uuid
+import logging
+from collections import Counter
+import metrics
+from assets import AssetManifest, build_assets, send_asset
+from auth_client import AuthClient, AuthUnavailable
+from cache_store import CacheDatabase
+from circuit_breaker import CircuitBreaker
+from http_cache import JsonPayload, PayloadMemo, list_response, page_args
+from model_warmup import ModelWarmup
+from movie_api import MovieApiClient
+from periodic import PeriodicJob, RateLimiter
+from recommender import BlendedRanker, parse_scores
+from session_store import SQLiteSessionInterface
+from single_flight import SingleFlight, SQLiteFlightLock
+from structured_logging import configure_logging, logging_options
+from structured_logging import stats as logging_stats
+from tiered_cache import TieredCache
+from title_index import TitleIndex
+from user_store import PasswordCheckBusy, PasswordHasher, UserStore
 
 load_dotenv()
+configure_logging(**logging_options(config))
+logger = logging.getLogger(__name__)
 os.environ["MPLCONFIGDIR"] = "/tmp/matplotlib"
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'default_secret_key')
 
+# Templates link static files through asset_url(), which names the
+# fingerprinted build in ASSET_OUTPUT_DIR once one exists.
+ASSET_DIR = os.path.join(app.root_path, config.ASSET_OUTPUT_DIR)
+asset_manifest = AssetManifest(ASSET_DIR)
+app.jinja_env.globals['asset_url'] = asset_manifest.url
+
 USER_DATA_FILE = 'users.json'
 supabase_client = None
 supabase_init_error = None
-try:
-    supabase_url = getattr(config, 'SUPABASE_URL', None) or os.getenv('SUPABASE_URL')
-    supabase_key = getattr(config, 'SUPABASE_KEY', None) or os.getenv('SUPABASE_KEY')
-    if supabase_url and supabase_key:
-        supabase_url = str(supabase_url).strip()
-        supabase_key = str(supabase_key).strip()
-
-        if supabase_url and supabase_key and len(supabase_url) > 0 and len(supabase_key) > 0:
-            if supabase_key.startswith('eyJ') and len(supabase_key) > 100:
-                if len(supabase_key) > 500:
-                    print(
-                        "Warning: SUPABASE_KEY appears to be a service_role key. Use the 'anon public' key instead for client-side authentication.")
-            elif not supabase_key.startswith('eyJ'):
-                print(f"Warning: SUPABASE_KEY format doesn't match expected JWT format.")
-                print(f"  Current key starts with: '{supabase_key[:20]}...' (length: {len(supabase_key)})")
-                print(f"  Expected: JWT token starting with 'eyJ' (200-300 characters)")
-                print(f"  Action: Go to Supabase Dashboard → Settings → API → Copy 'anon public' key")
-                supabase_init_error = f"SUPABASE_KEY format invalid. Current key starts with '{supabase_key[:20]}...' but should be a JWT token starting with 'eyJ'. Get the 'anon public' key from Supabase Dashboard → Settings → API."
-
-            try:
-                if not supabase_url or not supabase_key:
-                    raise ValueError("SUPABASE_URL and SUPABASE_KEY must both be provided")
-                supabase_client = create_client(supabase_url, supabase_key)
-
-                print("Supabase client initialized successfully")
-                print(f"Supabase URL: {supabase_url[:30]}...")
-            except (ValueError, TypeError, Exception) as client_error:
-                error_msg = str(client_error)
-                print(f"Warning: Could not create Supabase client: {error_msg}")
-                # Provide more helpful error messages for common issues
-                if "Invalid API key" in error_msg or "invalid" in error_msg.lower() and "key" in error_msg.lower():
-                    supabase_init_error = "Invalid Supabase API key. Please verify your SUPABASE_KEY environment variable in Render dashboard matches your Supabase project's anon/public key."
-                elif "url" in error_msg.lower() or "connection" in error_msg.lower():
-                    supabase_init_error = f"Supabase connection error: {error_msg}. Please verify your SUPABASE_URL is correct."
-                elif "proxy" in error_msg.lower() or "unexpected keyword" in error_msg.lower():
-                    supabase_init_error = f"Supabase client initialization error: {error_msg}. Ensure requirements.txt has httpx==0.24.1 and httpcore==0.17.3. This is a known compatibility issue with supabase-py 2.4.0."
-                else:
-                    supabase_init_error = error_msg
-                supabase_client = None
+supabase_lock = threading.Lock()
+supabase_initialized = False
+
+
+def init_supabase():
+    """
+    Create the Supabase client on first use. Importing supabase is slow, so
+    this runs lazily instead of while a worker boots.
+    """
+    global supabase_initialized
+    if supabase_initialized:
+        return supabase_client
+    with supabase_lock:
+        if supabase_initialized:
+            return supabase_client
+        _create_supabase_client()
+        supabase_initialized = True
+    return supabase_client
+
+
+def _create_supabase_client():
+    global supabase_client, supabase_init_error
+    try:
+        supabase_url = getattr(config, 'SUPABASE_URL', None) or os.getenv('SUPABASE_URL')
+        supabase_key = getattr(config, 'SUPABASE_KEY', None) or os.getenv('SUPABASE_KEY')
+        if supabase_url and supabase_key:
+            supabase_url = str(supabase_url).strip()
+            supabase_key = str(supabase_key).strip()
+
+            if supabase_url and supabase_key and len(supabase_url) > 0 and len(supabase_key) > 0:
+                if supabase_key.startswith('eyJ') and len(supabase_key) > 100:
+                    if len(supabase_key) > 500:
+                        logger.warning(
+                            "SUPABASE_KEY appears to be a service_role key. Use the 'anon public' key instead for client-side authentication.")
+                elif not supabase_key.startswith('eyJ'):
+                    logger.warning(
+                        "SUPABASE_KEY format doesn't match expected JWT format. Expected: JWT token starting with 'eyJ' "
+                        "(200-300 characters). Action: Go to Supabase Dashboard → Settings → API → Copy 'anon public' key",
+                        extra={'key_prefix': supabase_key[:20], 'key_length': len(supabase_key)})
+                    supabase_init_error = f"SUPABASE_KEY format invalid. Current key starts with '{supabase_key[:20]}...' but should be a JWT token starting with 'eyJ'. Get the 'anon public' key from Supabase Dashboard → Settings → API."
+
+                try:
+                    if not supabase_url or not supabase_key:
+                        raise ValueError("SUPABASE_URL and SUPABASE_KEY must both be provided")
+                    from supabase import create_client
+
+                    supabase_client = create_client(supabase_url, supabase_key, options=supabase_client_options())
+
+                    logger.info("Supabase client initialized successfully", extra={'supabase_url': supabase_url[:30]})
+                except (ValueError, TypeError, Exception) as client_error:
+                    error_msg = str(client_error)
+                    logger.warning("Could not create Supabase client", extra={'error': error_msg})
+                    # Provide more helpful error messages for common issues
+                    if "Invalid API key" in error_msg or "invalid" in error_msg.lower() and "key" in error_msg.lower():
+                        supabase_init_error = "Invalid Supabase API key. Please verify your SUPABASE_KEY environment variable in Render dashboard matches your Supabase project's anon/public key."
+                    elif "url" in error_msg.lower() or "connection" in error_msg.lower():
+                        supabase_init_error = f"Supabase connection error: {error_msg}. Please verify your SUPABASE_URL is correct."
+                    elif "proxy" in error_msg.lower() or "unexpected keyword" in error_msg.lower():
+                        supabase_init_error = f"Supabase client initialization error: {error_msg}. Ensure requirements.txt has httpx==0.24.1 and httpcore==0.17.3. This is a known compatibility issue with supabase-py 2.4.0."
+                    else:
+                        supabase_init_error = error_msg
+                    supabase_client = None
+            else:
+                error_msg = "SUPABASE_URL or SUPABASE_KEY is empty"
+                logger.warning(f"{error_msg}. Authentication features will be disabled.")
+                supabase_init_error = error_msg
         else:
-            error_msg = "SUPABASE_URL or SUPABASE_KEY is empty"
-            print(f"Warning: {error_msg}. Authentication features will be disabled.")
+            error_msg = "SUPABASE_URL or SUPABASE_KEY not set in environment variables"
+            logger.warning(f"{error_msg}. Authentication features will be disabled.")
             supabase_init_error = error_msg
-    else:
-        error_msg = "SUPABASE_URL or SUPABASE_KEY not set in environment variables"
-        print(f"Warning: {error_msg}. Authentication features will be disabled.")
+    except Exception as e:
+        error_msg = f"Error during Supabase initialization: {str(e)}"
+        logger.warning(f"{error_msg}. Authentication features will be disabled.")
         supabase_init_error = error_msg
-except Exception as e:
-    error_msg = f"Error during Supabase initialization: {str(e)}"
-    print(f"Warning: {error_msg}")
-    print("Authentication features will be disabled.")
-    supabase_init_error = error_msg
-    supabase_client = None
+        supabase_client = None
 
-app.config['SESSION_TYPE'] = 'filesystem'
-Session(app)
+
+def supabase_client_options():
+    """
+    Client options with explicit HTTP timeouts for auth calls, and without
+    the background token refresh that only makes sense for a single user.
+    None (library defaults) on supabase versions that don't take them.
+    """
+    try:
+        import httpx
+        from supabase import ClientOptions
+
+        timeout = httpx.Timeout(config.AUTH_READ_TIMEOUT, connect=config.AUTH_CONNECT_TIMEOUT)
+        return ClientOptions(auto_refresh_token=False, persist_session=False,
+                             httpx_client=httpx.Client(timeout=timeout))
+    except (ImportError, TypeError):
+        return None
+
+
+auth_client = AuthClient(
+    init_supabase,
+    timeout=config.AUTH_TIMEOUT,
+    retries=config.AUTH_RETRIES,
+    backoff_base=config.AUTH_BACKOFF_BASE,
+    backoff_max=config.AUTH_BACKOFF_MAX,
+    max_in_flight=config.AUTH_MAX_IN_FLIGHT,
+    session_ttl=config.AUTH_SESSION_CACHE_TTL,
+)
+
+
+def auth_unavailable_message():
+    error_msg = "Authentication service is not available."
+    if supabase_init_error:
+        error_msg += f" {supabase_init_error}"
+    else:
+        error_msg += " Please check your SUPABASE_URL and SUPABASE_KEY environment variables in your Render dashboard."
+    return error_msg
+
+
+# Sessions: "cookie" keeps the small session dict in a signed cookie (Flask's
+# default), "sqlite" keeps it server-side in SESSION_DB_PATH, "filesystem" is
+# flask-session's one-file-per-session store.
+session_sweeper = None
+if config.SESSION_BACKEND == 'sqlite':
+    session_interface = SQLiteSessionInterface(CacheDatabase(config.SESSION_DB_PATH), ttl=config.SESSION_TTL)
+    session_interface.create_table()
+    app.session_interface = session_interface
+    session_sweeper = PeriodicJob(session_interface.sweep, interval=config.SESSION_SWEEP_INTERVAL,
+                                  name='session-sweeper')
+elif config.SESSION_BACKEND == 'filesystem':
+    app.config['SESSION_TYPE'] = 'filesystem'
+    Session(app)
+
+try:
+    from flask_sock import Sock
+
+    sock = Sock(app)
+except ImportError:
+    logger.warning("flask-sock not installed. Live emotion streaming will be disabled.")
+    sock = None
 
 
-def load_users():
-    if os.path.exists(USER_DATA_FILE):
-        with open(USER_DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+user_store = UserStore(
+    CacheDatabase(config.USER_DB_PATH),
+    PasswordHasher(max_workers=config.PASSWORD_HASH_WORKERS, max_queue=config.PASSWORD_HASH_MAX_QUEUE,
+                   timeout=config.PASSWORD_HASH_TIMEOUT, retry_after=config.PASSWORD_HASH_RETRY_AFTER),
+)
+
+
+def init_user_store():
+    """Create the users table and import users.json if a previous version left one."""
+    try:
+        user_store.create_table()
+        migrated = user_store.migrate_json(USER_DATA_FILE)
+        if migrated:
+            logger.info("Migrated users from JSON", extra={'event': 'users_migrated', 'users': migrated,
+                                                          'path': USER_DATA_FILE})
+    except Exception as e:
+        logger.error("Error initializing user store", extra={'event': 'user_store_init_failed', 'error': str(e)})
 
 
 DATABASE = 'movie_cache.db'
 
 
+cache_db = CacheDatabase(DATABASE)
+title_index = TitleIndex(cache_db)
+SEARCH_RESULT_LIMIT = 25
+# Distinct queries counted in memory between flushes; more are not counted.
+SEARCH_QUERY_MAX_PENDING = 10000
+
+# Cache tables keyed by genre / search query. Rows store when they were
+# fetched and when they expire (integer epoch seconds, hard TTL); expired rows
+# are still served as a last resort until cache maintenance removes them.
+CACHE_TABLES = {
+    'movie_cache': ('genre', 'movies'),
+    'search_cache': ('search_query', 'results'),
+}
+
+
 def init_db():
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS movie_cache (
-                    genre TEXT PRIMARY KEY,
-                    movies TEXT,
-                    timestamp TEXT
+        for table, (key_column, value_column) in CACHE_TABLES.items():
+            cache_db.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {key_column} TEXT PRIMARY KEY,
+                    {value_column} TEXT,
+                    stored_at INTEGER,
+                    expires_at INTEGER
                 )
             ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS search_cache (
-                    search_query TEXT PRIMARY KEY,
-                    results TEXT,
-                    timestamp TEXT
-                )
-            ''')
-            conn.commit()
+            # Databases from before expiry columns have a local-time "timestamp" text column.
+            added = cache_db.add_columns(table, {'stored_at': 'INTEGER', 'expires_at': 'INTEGER'})
+            if 'stored_at' in added:
+                cache_db.execute(f'''
+                    UPDATE {table} SET
+                        stored_at = CAST(strftime('%s', timestamp, 'utc') AS INTEGER),
+                        expires_at = CAST(strftime('%s', timestamp, 'utc') AS INTEGER) + ?
+                    WHERE timestamp IS NOT NULL
+                ''', (config.MOVIE_CACHE_HARD_TTL,))
+            cache_db.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_expires_at ON {table} (expires_at)')
+        cache_db.execute('''
+            CREATE TABLE IF NOT EXISTS search_queries (
+                search_query TEXT PRIMARY KEY,
+                hits INTEGER,
+                last_seen REAL
+            )
+        ''')
+        cache_db.execute('''
+            CREATE TABLE IF NOT EXISTS flight_locks (
+                key TEXT PRIMARY KEY,
+                owner TEXT,
+                expires_at REAL
+            )
+        ''')
+    except Exception as e:
+        logger.error("Error initializing database", extra={'event': 'db_init_failed', 'error': str(e)})
+    if config.SEARCH_LOCAL_INDEX:
+        init_title_index()
+
+
+def init_title_index():
+    """Create the title index, filling it from the cached lists the first time."""
+    try:
+        title_index.create()
+        if not title_index.is_empty():
+            return
+        for (movies_json,) in cache_db.execute('SELECT movies FROM movie_cache').fetchall():
+            title_index.add(shape_movie(movie, keep_trailer=True) for movie in json.loads(movies_json))
+        for (results_json,) in cache_db.execute('SELECT results FROM search_cache').fetchall():
+            title_index.add(json.loads(results_json))
     except Exception as e:
-        print(f"Error initializing database: {e}")
+        logger.error("Error initializing title index", extra={'event': 'title_index_init_failed', 'error': str(e)})
 
 
+@metrics.timed('get_movies', 'sqlite_load')
 def get_cached_movies(genre):
+    """(movies, stored_at epoch seconds) from SQLite, or None; expiry is up to the caller."""
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT movies, timestamp FROM movie_cache WHERE genre = ?', (genre,))
-            row = cursor.fetchone()
-
-            if row:
-                movies_json = row[0]
-                timestamp = datetime.strptime(row[1], '%Y-%m-%d %H:%M:%S')
-                if datetime.now() - timestamp < timedelta(hours=1):
-                    return json.loads(movies_json)
+        row = cache_db.execute('SELECT movies, stored_at FROM movie_cache WHERE genre = ?', (genre,)).fetchone()
+        if row and row[1] is not None:
+            return json.loads(row[0]), row[1]
     except Exception as e:
-        print(f"Error getting cached movies: {e}")
+        logger.error("Error getting cached movies", extra={'event': 'cache_read_failed', 'error': str(e)})
     return None
 
 
+@metrics.timed('get_movies', 'sqlite_store')
 def store_cached_movies(genre, movies):
+    now = int(time.time())
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                REPLACE INTO movie_cache (genre, movies, timestamp) 
-                VALUES (?, ?, ?)
-            ''', (genre, json.dumps(movies), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-            conn.commit()
+        cache_db.execute('''
+            REPLACE INTO movie_cache (genre, movies, stored_at, expires_at)
+            VALUES (?, ?, ?, ?)
+        ''', (genre, json.dumps(movies), now, now + config.MOVIE_CACHE_HARD_TTL))
     except Exception as e:
-        print(f"Error storing cached movies: {e}")
+        logger.error("Error storing cached movies", extra={'event': 'cache_write_failed', 'error': str(e)})
+    index_titles(shape_movie(movie, keep_trailer=True) for movie in movies)
 
 
-def save_users(users):
+def index_titles(movies):
+    if not config.SEARCH_LOCAL_INDEX:
+        return
     try:
-        with open(USER_DATA_FILE, 'w') as f:
-            json.dump(users, f)
+        title_index.add(movies)
     except Exception as e:
-        print(f"Error saving users: {e}")
+        logger.error("Error indexing movie titles", extra={'event': 'title_index_write_failed', 'error': str(e)})
 
 
 def is_valid_email(email):
@@ -195,31 +350,51 @@ def password_issues(password: str) -> list:
 
 
 def create_user(email, password):
-    users = load_users()
-    if email in users:
-        return False
-    hashed_password = generate_password_hash(password)
-    users[email] = hashed_password
-    save_users(users)
-    return True
+    return user_store.create(email, password)
 
 
 def validate_user(email, password):
-    users = load_users()
-    if email in users and check_password_hash(users[email], password):
-        return True
-    return False
+    """Raises PasswordCheckBusy when too many password checks are already running."""
+    return user_store.validate(email, password)
+
+
+def password_check_busy_response(template, error, **context):
+    flash("Too many sign-ins in progress. Please try again in a moment.", "warning")
+    response = app.make_response((render_template(template, **context), 503))
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def register_local_user(email, password):
+    try:
+        created = create_user(email, password)
+    except PasswordCheckBusy as e:
+        return password_check_busy_response('register.html', e, email=email)
+    if not created:
+        flash('An account with this email already exists.', 'danger')
+        return render_template('register.html', email=email)
+    flash('Registration successful! You can log in now.', 'success')
+    return redirect(url_for('login'))
+
+
+def login_local_user(email, password):
+    try:
+        valid = validate_user(email, password)
+    except PasswordCheckBusy as e:
+        return password_check_busy_response('login.html', e)
+    if not valid:
+        flash("Login failed: Invalid email or password.", "danger")
+        return render_template('login.html')
+    session['user'] = {'id': f'local:{email}', 'email': email, 'user_metadata': {}}
+    flash('Login successful!', 'success')
+    return redirect(url_for('home'))
 
 
 @app.route('/resend_confirmation', methods=['POST'])
 def resend_confirmation():
+    init_supabase()
     if not supabase_client:
-        error_msg = "Authentication service is not available."
-        if supabase_init_error:
-            error_msg += f" {supabase_init_error}"
-        else:
-            error_msg += " Please check your SUPABASE_URL and SUPABASE_KEY environment variables in your Render dashboard."
-        flash(error_msg, "danger")
+        flash(auth_unavailable_message(), "danger")
         return redirect(url_for('login'))
 
     email = request.form.get('email', '').strip()
@@ -227,11 +402,13 @@ def resend_confirmation():
         flash("Email is required.", "danger")
         return redirect(url_for('login'))
     try:
-        response = supabase_client.auth.api.resend_confirmation(email)
+        response = auth_client.resend_confirmation(email)
         if "error" in response:
             flash("Error sending confirmation email: " + response["error"]["message"], "danger")
         else:
             flash("A new confirmation email has been sent. Please check your inbox.", "success")
+    except AuthUnavailable as e:
+        flash(f"{e}. Please try again in a moment.", "warning")
     except Exception as e:
         flash(f"Error: {str(e)}", "danger")
     return redirect(url_for('login'))
@@ -254,6 +431,8 @@ def register():
             flash(suggestion_html, 'danger')
             return render_template('register.html', email=email)
 
+        if config.LOCAL_AUTH:
+            return register_local_user(email, password)
         response = safe_supabase_sign_up(email, password)
 
         if response and "error" in response:
@@ -266,26 +445,17 @@ def register():
 
 
 def safe_supabase_sign_up(email, password):
+    init_supabase()
     if not supabase_client:
-        error_msg = "Authentication service is not available."
-        if supabase_init_error:
-            error_msg += f" {supabase_init_error}"
-        else:
-            error_msg += " Please check your SUPABASE_URL and SUPABASE_KEY environment variables in your Render dashboard."
-        return {"error": {"message": error_msg}}
+        return {"error": {"message": auth_unavailable_message()}}
 
-    retries = 3
-    for attempt in range(retries):
-        try:
-            return supabase_client.auth.sign_up({"email": email, "password": password})
-        except Exception as e:
-            if attempt < retries - 1:
-                time.sleep(2)
-            else:
-                print(f"Supabase Error after {retries} attempts: {str(e)}")
-                return {"error": {"message": str(e)}}
-    print('Failed to connect to the server after retries.')
-    return {"error": {"message": "Failed to connect to the server. Please try again later."}}
+    try:
+        return auth_client.sign_up(email, password)
+    except AuthUnavailable as e:
+        return {"error": {"message": f"{e}. Please try again in a moment."}}
+    except Exception as e:
+        logger.error("Supabase sign-up failed", extra={'event': 'auth_failed', 'error': str(e)})
+        return {"error": {"message": str(e)}}
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -297,20 +467,15 @@ def login():
         if not email or not password:
             flash("Email and password are required!", "danger")
             return render_template('login.html')
+        if config.LOCAL_AUTH:
+            return login_local_user(email, password)
+        init_supabase()
         if not supabase_client:
-            error_msg = "Authentication service is not available."
-            if supabase_init_error:
-                error_msg += f" {supabase_init_error}"
-            else:
-                error_msg += " Please check your SUPABASE_URL and SUPABASE_KEY environment variables in your Render dashboard."
-            flash(error_msg, "danger")
+            flash(auth_unavailable_message(), "danger")
             return render_template('login.html')
 
         try:
-            response = supabase_client.auth.sign_in_with_password({
-                "email": email,
-                "password": password
-            })
+            response = auth_client.sign_in(email, password)
 
             if hasattr(response, 'error') and response.error:
                 error_message = response.error.get("message", "Unknown error")
@@ -325,9 +490,13 @@ def login():
                     'email': user.email,
                     'user_metadata': user.user_metadata,
                 }
+                if config.AUTH_VERIFY_SESSIONS and response.session is not None:
+                    session['access_token'] = response.session.access_token
                 flash('Login successful!', 'success')
                 return redirect(url_for('home'))
 
+        except AuthUnavailable as e:
+            flash(f"{e}. Please try again in a moment.", 'warning')
         except Exception as e:
             flash(f"An unexpected error occurred: {str(e)}", 'danger')
 
@@ -336,19 +505,55 @@ def login():
 
 @app.route('/logout')
 def logout():
+    access_token = session.get('access_token')
+    if access_token:
+        auth_client.forget(access_token)
     session.clear()
     flash('You have been logged out.', 'success')
     return redirect(url_for('login'))
 
 
+@app.before_request
+def start_request_metrics():
+    endpoint = request.endpoint or 'unknown'
+    g.metrics_endpoint = endpoint
+    g.metrics_start = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.labels(endpoint).inc()
+
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is None:
+        return
+    metrics.REQUESTS_IN_FLIGHT.labels(endpoint).dec()
+    metrics.REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - g.pop('metrics_start'))
+
+
 @app.after_request
 def add_no_cache_headers(response):
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, private, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+    # Routes that are safe to cache (the movie lists, /assets/, /static/) set
+    # their own Cache-Control; everything else, auth pages included, stays
+    # no-store.
+    if 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, private, max-age=0'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
     return response
 
 
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Fingerprinted static files, cached for ASSET_MAX_AGE and never revalidated"""
+    return send_asset(ASSET_DIR, filename, max_age=config.ASSET_MAX_AGE)
+
+
+def build_static_assets():
+    manifest = build_assets(app.static_folder, ASSET_DIR, webp_quality=config.ASSET_WEBP_QUALITY)
+    asset_manifest.reload()
+    return manifest
+
+
 emotion_to_genre = {
     "happy": "Comedy",
     "sad": "Drama",
@@ -362,84 +567,64 @@ RAPIDAPI_KEY = os.getenv('RAPIDAPI_KEY')
 RAPIDAPI_HOST = os.getenv('RAPIDAPI_HOST')
 
 if not RAPIDAPI_KEY or not RAPIDAPI_HOST:
-    print("Warning: RAPIDAPI_KEY or RAPIDAPI_HOST not set. Movie recommendations may not work.")
-
-emotion_detector = None
-
-try:
-    from fer import FER
-
-    emotion_detector = FER(mtcnn=False)
-    print("✅ FER initialized successfully")
-except Exception as e:
-    print("❌ FER initialization failed:", e)
-    emotion_detector = None
-
-EMOTION_MAP = {
-    "angry": "anger",
-    "disgust": "anger",
-    "fear": "fear",
-    "happy": "happy",
-    "sad": "sad",
-    "surprise": "surprise",
-    "neutral": "neutral"
-}
-
-
-def detect_emotion(image_data):
-    if emotion_detector is None:
-        print("⚠️ FER not initialized")
-        return "neutral"
-
-    try:
-        nparr = np.frombuffer(image_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        if frame is None:
-            print("⚠️ Frame decode failed")
-            return "neutral"
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame = cv2.resize(frame, (640, 480))
-
-        results = emotion_detector.detect_emotions(frame)
-
-        if not results:
-            print("⚠️ No face detected")
-            return "neutral"
-        best_emotion = "neutral"
-        best_score = 0.0
+    logger.warning("RAPIDAPI_KEY or RAPIDAPI_HOST not set. Movie recommendations may not work.")
+
+# Consecutive RapidAPI failures open the circuit; while it is open movie
+# requests are answered from the last known good cache without waiting.
+movie_api_breaker = CircuitBreaker(
+    failure_threshold=config.RAPIDAPI_FAILURE_THRESHOLD,
+    reset_timeout=config.RAPIDAPI_RESET_TIMEOUT,
+)
+movie_api = MovieApiClient(
+    RAPIDAPI_KEY,
+    RAPIDAPI_HOST,
+    url=config.RAPIDAPI_URL,
+    connect_timeout=config.RAPIDAPI_CONNECT_TIMEOUT,
+    read_timeout=config.RAPIDAPI_READ_TIMEOUT,
+    pool_size=config.RAPIDAPI_POOL_SIZE,
+    max_concurrency=config.RAPIDAPI_MAX_CONCURRENCY,
+    breaker=movie_api_breaker,
+)
+
+def load_emotion_service(start_pool=True):
+    import emotion_service
+
+    emotion_service.load(start_pool=start_pool)
+    if not emotion_service.is_ready():
+        # Counted as a failed warm-up so it is retried after a back-off.
+        raise RuntimeError("Emotion backend failed to load")
+    return emotion_service
+
+
+model_warmup = ModelWarmup(load_emotion_service)
+
+
+def get_emotion_service():
+    """The emotion pipeline once warm-up is done, waiting up to EMOTION_WARMUP_WAIT seconds; else None."""
+    return model_warmup.get(timeout=config.EMOTION_WARMUP_WAIT)
+
+
+def model_loading_response():
+    response = jsonify({'success': False, 'message': 'Emotion detection is starting up. Please try again shortly.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(config.EMOTION_RETRY_AFTER)
+    return response
 
-        for face in results:
-            for emotion, score in face["emotions"].items():
-                if score > best_score:
-                    best_score = score
-                    best_emotion = emotion
 
-        print("🎯 Emotion scores:", results)
-        print("🎯 Selected emotion:", best_emotion, best_score)
+def inference_busy_response(error):
+    response = jsonify({'success': False, 'message': 'Emotion detection is busy. Please try again shortly.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
 
-        return EMOTION_MAP.get(best_emotion, "neutral")
 
-    except Exception as e:
-        print("❌ FER ERROR:", e)
-        return "neutral"
+@metrics.timed('get_movies', 'lookup')
+def get_movie_recommendations(genre):
+    return movie_cache.get(genre) or []
 
 
-def get_movie_recommendations(genre):
-    cached_movies = get_cached_movies(genre)
-    if cached_movies:
-        return cached_movies
-
-    if not RAPIDAPI_KEY or not RAPIDAPI_HOST:
-        print("RAPIDAPI_KEY or RAPIDAPI_HOST not configured")
-        return []
-
-    url = "https://imdb236.p.rapidapi.com/api/imdb/search"
-    headers = {
-        "x-rapidapi-key": RAPIDAPI_KEY,
-        "x-rapidapi-host": RAPIDAPI_HOST
-    }
-    params = {
+def movie_search_params(genre):
+    return {
         "type": "movie",
         "genre": genre,
         "rows": 100,
@@ -455,21 +640,47 @@ def get_movie_recommendations(genre):
         "startYearTo": "2026",
     }
 
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=5)
-        print("RAPIDAPI STATUS:", response.status_code)
 
-        response.raise_for_status()
-        movies = response.json().get('results', [])
-        store_cached_movies(genre, movies.copy())
-        return movies
+@metrics.timed('get_movies', 'fetch')
+def fetch_movie_recommendations(genre):
+    if not movie_api.configured:
+        logger.warning("RAPIDAPI_KEY or RAPIDAPI_HOST not configured", extra={'event': 'rapidapi_unconfigured'})
+        return None
+
+    try:
+        return movie_api.search(movie_search_params(genre)).get('results', [])
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching movies: {e}")
-        return []
+        logger.error("Error fetching movies", extra={'event': 'rapidapi_failed', 'error': str(e)})
+        return None
 
 
 @app.route('/detect_emotion', methods=['POST'])
 def detect_emotion_from_image():
+    service = get_emotion_service()
+    if service is None:
+        return model_loading_response()
+    track_key = session.get('user', {}).get('id')
+    raw_file = request.files.get('raw')
+    if raw_file:
+        # Uncompressed pixels straight from the client's canvas: no decode needed.
+        from frame_decode import wrap_raw
+
+        try:
+            width = int(request.form['width'])
+            height = int(request.form['height'])
+            channels = int(request.form.get('channels', 1))
+        except (KeyError, ValueError):
+            return jsonify({'success': False, 'message': 'Raw uploads need integer width, height and channels.'}), 400
+        try:
+            gray = wrap_raw(raw_file.read(), width, height, channels)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        try:
+            emotion, scores = service.detect_emotion_in_frame_with_scores(gray, track_key=track_key)
+        except service.InferenceBusy as e:
+            return inference_busy_response(e)
+        return jsonify({'success': True, 'emotion': emotion, 'scores': scores})
+
     image_file = request.files.get('image')
     if not image_file:
         return jsonify({'success': False, 'message': 'No image provided'}), 400
@@ -477,71 +688,175 @@ def detect_emotion_from_image():
         return jsonify({'success': False, 'message': 'Invalid image format. Only PNG, JPG, or JPEG allowed.'}), 400
 
     image_data = image_file.read()
-    emotion = detect_emotion(image_data)
+    try:
+        emotion, scores = service.detect_emotion_with_scores(image_data, track_key=track_key)
+    except service.InferenceBusy as e:
+        return inference_busy_response(e)
     if emotion:
-        return jsonify({'success': True, 'emotion': emotion})
+        return jsonify({'success': True, 'emotion': emotion, 'scores': scores})
     else:
         return jsonify({'success': False, 'message': 'Emotion detection failed'})
 
 
+@app.route('/detect_emotion_batch', methods=['POST'])
+def detect_emotion_batch_from_images():
+    image_files = [f for f in request.files.getlist('images') if f]
+    if not image_files:
+        return jsonify({'success': False, 'message': 'No images provided'}), 400
+    if len(image_files) > config.EMOTION_BATCH_MAX_IMAGES:
+        return jsonify({'success': False,
+                        'message': f'Too many images. At most {config.EMOTION_BATCH_MAX_IMAGES} allowed per request.'}), 400
+    for image_file in image_files:
+        if not image_file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            return jsonify({'success': False, 'message': 'Invalid image format. Only PNG, JPG, or JPEG allowed.'}), 400
+
+    service = get_emotion_service()
+    if service is None:
+        return model_loading_response()
+    try:
+        emotions = service.detect_emotions_batch([image_file.read() for image_file in image_files])
+    except service.InferenceBusy as e:
+        return inference_busy_response(e)
+    return jsonify({
+        'success': True,
+        'results': [{'filename': f.filename, 'emotion': emotion} for f, emotion in zip(image_files, emotions)]
+    })
+
+
+if sock is not None:
+    @sock.route('/emotion_stream')
+    def emotion_stream(ws):
+        service = get_emotion_service()
+        if service is None:
+            ws.send(json.dumps({'error': 'Emotion detection is starting up. Please try again shortly.'}))
+            return
+        from emotion_stream import run_emotion_stream
+
+        track_key = f"stream-{uuid.uuid4().hex}"
+        try:
+            run_emotion_stream(
+                ws,
+                lambda frame: service.analyze_images([frame], track_key, use_cache=False)[0],
+                service.EMOTION_MAP,
+                target_fps=config.EMOTION_STREAM_FPS,
+                alpha=config.EMOTION_STREAM_ALPHA,
+                idle_timeout=config.EMOTION_STREAM_IDLE_TIMEOUT,
+            )
+        finally:
+            if service.face_tracker is not None:
+                service.face_tracker.forget(track_key)
+
+
+movie_payloads = PayloadMemo()
+# Blended lists, one per score vector rounded to BLEND_SCORE_DIGITS decimals,
+# each kept until the ranking index is rebuilt.
+BLEND_SCORE_DIGITS = 2
+blended_payloads = PayloadMemo(max_entries=1024)
+EMPTY_MOVIES = JsonPayload({'movies': []})
+MOVIES_CACHE_CONTROL = f"public, max-age={config.MOVIES_MAX_AGE}, stale-while-revalidate={config.MOVIES_MAX_AGE}"
+SEARCH_CACHE_CONTROL = f"public, max-age={config.SEARCH_MAX_AGE}"
+
+
 @app.route('/get_movies', methods=['GET'])
 def get_movies():
     emotion = request.args.get('emotion', 'happy')
     genre = emotion_to_genre.get(emotion, 'Comedy')
+    try:
+        offset, limit = page_args(config.MOVIES_PAGE_SIZE, config.MOVIES_MAX_PAGE_SIZE)
+        scores = None
+        if config.RECOMMEND_MODE == 'blend' and request.args.get('scores'):
+            scores = parse_scores(request.args['scores'], emotion_to_genre)
+    except ValueError as e:
+        return jsonify({'movies': [], 'message': str(e)}), 400
+    if scores:
+        scores = {emotion: round(score, BLEND_SCORE_DIGITS) for emotion, score in scores.items()}
+        index = blended_ranker.index(blended_genre_lists())
+        payload = blended_payloads.get(tuple(sorted(scores.items())), index,
+                                       lambda index: {'movies': blended_ranker.rank(index, scores)})
+        if not payload.data['movies']:
+            return list_response(EMPTY_MOVIES, 'movies', offset, limit, 'no-cache')
+        return list_response(payload, 'movies', offset, limit, MOVIES_CACHE_CONTROL)
     response = get_movie_recommendations(genre)
     if not response:
-        return jsonify({'movies': []})
-    movies = []
+        return list_response(EMPTY_MOVIES, 'movies', offset, limit, 'no-cache')
+    # The shaped, serialized list is kept until the cached genre list changes.
+    with metrics.timed('get_movies', 'shape'):
+        payload = movie_payloads.get(genre, response, shape_movie_list)
+    return list_response(payload, 'movies', offset, limit, MOVIES_CACHE_CONTROL)
 
-    for movie in response:
-        if not isinstance(movie, dict):
-            continue
-        primary_title = movie.get('primaryTitle')
-        if not primary_title:
-            continue
-        description = movie.get('description', 'No description available.')
-        primary_image = movie.get('primaryImage', None)
-        trailer_url = movie.get('trailerUrl', None)
-        if description and len(description) > 100:
-            description = description[:97] + '...'
-        if primary_image and description:
-            movies.append({
-                'primaryTitle': primary_title,
-                'description': description,
-                'primaryImage': primary_image,
-                "trailerUrl": f"https://www.youtube.com/results?search_query={primary_title.replace(' ', '+')}+trailer"
-            })
-    return jsonify({'movies': movies})
+
+def blended_genre_lists():
+    """The cached list of every genre blended recommendations draw on; uncached genres are fetched together."""
+    missing = [genre for genre in blended_ranker.genres if not movie_cache.contains(genre)]
+    if missing:
+        prefetch_movie_recommendations(missing)
+    # An empty tuple rather than a fresh [] keeps the ranker's identity check from rebuilding every time.
+    return {genre: movie_cache.get(genre) or () for genre in blended_ranker.genres}
+
+
+def shape_movie_list(movies):
+    return {'movies': [shaped for shaped in (shape_movie(movie) for movie in movies) if shaped]}
+
+
+def shape_movie(movie, keep_trailer=False):
+    """
+    The fields the page shows for one RapidAPI result, or None if it has no
+    title, image or description. The trailer link is a YouTube search unless
+    ``keep_trailer`` and the result has its own.
+    """
+    if not isinstance(movie, dict):
+        return None
+    primary_title = movie.get('primaryTitle')
+    if not primary_title:
+        return None
+    description = movie.get('description', 'No description available.')
+    primary_image = movie.get('primaryImage', None)
+    trailer_url = movie.get('trailerUrl', None) if keep_trailer else None
+    if description and len(description) > 100:
+        description = description[:97] + '...'
+    if not (primary_image and description):
+        return None
+    return {
+        'primaryTitle': primary_title,
+        'description': description,
+        'primaryImage': primary_image,
+        'trailerUrl': trailer_url or f"https://www.youtube.com/results?search_query={primary_title.replace(' ', '+')}+trailer"
+    }
 
 
+# Ranks the cached genre lists against a detected emotion score vector.
+blended_ranker = BlendedRanker(
+    emotion_to_genre,
+    shape_movie,
+    max_results=config.RECOMMEND_MAX_RESULTS,
+    quality_weights=(config.RECOMMEND_RATING_WEIGHT, config.RECOMMEND_VOTES_WEIGHT, config.RECOMMEND_YEAR_WEIGHT),
+)
+
+
+@metrics.timed('search_movie', 'sqlite_load')
 def get_cached_search_results(search_query):
+    """(results, stored_at epoch seconds) from SQLite, or None; expiry is up to the caller."""
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT results, timestamp FROM search_cache WHERE search_query = ?', (search_query,))
-            row = cursor.fetchone()
-
-            if row:
-                results_json = row[0]
-                timestamp = datetime.strptime(row[1], '%Y-%m-%d %H:%M:%S')
-                if datetime.now() - timestamp < timedelta(hours=1):
-                    return json.loads(results_json)
+        row = cache_db.execute(
+            'SELECT results, stored_at FROM search_cache WHERE search_query = ?', (search_query,)).fetchone()
+        if row and row[1] is not None:
+            return json.loads(row[0]), row[1]
     except Exception as e:
-        print(f"Error getting cached search results: {e}")
+        logger.error("Error getting cached search results", extra={'event': 'cache_read_failed', 'error': str(e)})
     return None
 
 
+@metrics.timed('search_movie', 'sqlite_store')
 def store_cached_search_results(search_query, results):
+    now = int(time.time())
     try:
-        with sqlite3.connect(DATABASE) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                REPLACE INTO search_cache (search_query, results, timestamp) 
-                VALUES (?, ?, ?)
-            ''', (search_query, json.dumps(results), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-            conn.commit()
+        cache_db.execute('''
+            REPLACE INTO search_cache (search_query, results, stored_at, expires_at)
+            VALUES (?, ?, ?, ?)
+        ''', (search_query, json.dumps(results), now, now + config.MOVIE_CACHE_HARD_TTL))
     except Exception as e:
-        print(f"Error storing cached search results: {e}")
+        logger.error("Error storing cached search results", extra={'event': 'cache_write_failed', 'error': str(e)})
+    index_titles(results)
 
 
 @app.route('/search_movie', methods=['GET'])
@@ -549,64 +864,266 @@ def search_movie():
     search_query = request.args.get('query', '').strip()
     if not search_query:
         return jsonify({'movies': []})
+    try:
+        offset, limit = page_args(config.MOVIES_PAGE_SIZE, config.MOVIES_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'movies': [], 'message': str(e)}), 400
+    search_key = normalize_search_query(search_query)
+    record_search_query(search_key)
+
+    # Titles we already know answer most autocomplete keystrokes; RapidAPI
+    # is only asked when they come up short.
+    # Fuzzy (typo) matches only fill the list; they never stand in for a call.
+    local, fuzzy = search_title_index(search_key)
+    if config.SEARCH_LOCAL_INDEX and len(local) >= config.SEARCH_LOCAL_MIN_RESULTS:
+        return list_response(JsonPayload({'movies': local}), 'movies', offset, limit, SEARCH_CACHE_CONTROL)
+
+    with metrics.timed('search_movie', 'lookup'):
+        movies = list(search_cache.get(search_key) or [])
+    titles = {movie['primaryTitle'] for movie in movies}
+    movies += [movie for movie in local + fuzzy if movie['primaryTitle'] not in titles]
+    if not movies:
+        return list_response(EMPTY_MOVIES, 'movies', offset, limit, 'no-cache')
+    payload = JsonPayload({'movies': movies[:SEARCH_RESULT_LIMIT]})
+    return list_response(payload, 'movies', offset, limit, SEARCH_CACHE_CONTROL)
+
+
+@metrics.timed('search_movie', 'local_index')
+def search_title_index(search_key):
+    """(prefix matches, fuzzy matches) from the local title index."""
+    if not config.SEARCH_LOCAL_INDEX:
+        return [], []
+    try:
+        return title_index.search(search_key, limit=SEARCH_RESULT_LIMIT, min_results=config.SEARCH_LOCAL_MIN_RESULTS)
+    except Exception as e:
+        logger.error("Error searching title index", extra={'event': 'title_index_read_failed', 'error': str(e)})
+        return [], []
 
-    cached_results = get_cached_search_results(search_query)
-    if cached_results:
-        return jsonify({'movies': cached_results})
 
-    if not RAPIDAPI_KEY or not RAPIDAPI_HOST:
-        print("RAPIDAPI_KEY or RAPIDAPI_HOST not configured")
-        return jsonify({'movies': []})
+def normalize_search_query(search_query):
+    """Case and whitespace don't change the autocomplete results, so they share one cache entry."""
+    return ' '.join(search_query.split()).lower()
+
+
+@metrics.timed('search_movie', 'fetch')
+def fetch_search_results(search_query):
+    if not movie_api.configured:
+        logger.warning("RAPIDAPI_KEY or RAPIDAPI_HOST not configured", extra={'event': 'rapidapi_unconfigured'})
+        return None
 
-    url = "https://imdb236.p.rapidapi.com/api/imdb/search"
-    headers = {
-        "x-rapidapi-key": RAPIDAPI_KEY,
-        "x-rapidapi-host": RAPIDAPI_HOST
-    }
     params = {
         "primaryTitleAutocomplete": search_query,
         "type": "movie",
-        "rows": "25",
+        "rows": str(SEARCH_RESULT_LIMIT),
         "sortOrder": "ASC",
         "sortField": "id",
     }
 
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=5)
-        print("RAPIDAPI STATUS:", response.status_code)
-
-        response.raise_for_status()
-        data = response.json()
+        data = movie_api.search(params)
     except requests.exceptions.RequestException as e:
-        print(f"Error searching movies: {e}")
-        return jsonify({'movies': []})
+        logger.error("Error searching movies", extra={'event': 'rapidapi_failed', 'error': str(e)})
+        return None
+
+    movies = [shape_movie(movie, keep_trailer=True) for movie in data.get('results', [])]
+    return [movie for movie in movies if movie]
+
+
+search_query_counts = Counter()
+search_query_counts_lock = threading.Lock()
+
+
+def record_search_query(search_query):
+    """Count a search in memory; flush_search_queries() hands the counts to the cache warmer."""
+    with search_query_counts_lock:
+        if search_query in search_query_counts or len(search_query_counts) < SEARCH_QUERY_MAX_PENDING:
+            search_query_counts[search_query] += 1
+
+
+def flush_search_queries():
+    """Add this worker's search counts to the search_queries table; returns how many queries were written."""
+    global search_query_counts
+    with search_query_counts_lock:
+        counts, search_query_counts = search_query_counts, Counter()
+    if not counts:
+        return 0
+    now = time.time()
+    try:
+        conn = cache_db.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('''
+                INSERT INTO search_queries (search_query, hits, last_seen) VALUES (?, ?, ?)
+                ON CONFLICT(search_query) DO UPDATE SET hits = hits + excluded.hits, last_seen = excluded.last_seen
+            ''', [(query, hits, now) for query, hits in counts.items()])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    except Exception as e:
+        logger.error("Error recording search queries", extra={'event': 'search_query_write_failed', 'error': str(e)})
+        # Keep the counts for the next pass.
+        with search_query_counts_lock:
+            search_query_counts.update(counts)
+        return 0
+    return len(counts)
+
+
+def get_top_search_queries(limit, window):
+    """The most searched queries among those seen in the last ``window`` seconds."""
+    try:
+        cursor = cache_db.execute(
+            'SELECT search_query FROM search_queries WHERE last_seen >= ? ORDER BY hits DESC LIMIT ?',
+            (time.time() - window, limit))
+        return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error("Error getting top search queries", extra={'event': 'search_query_read_failed', 'error': str(e)})
+    return []
+
+
+def make_flight(namespace):
+    """Coalesces identical RapidAPI fetches within this worker, and across workers if enabled."""
+    lock = None
+    if config.RAPIDAPI_SHARED_FETCH_LOCK:
+        lock = SQLiteFlightLock(cache_db, namespace, ttl=config.RAPIDAPI_FETCH_LOCK_TTL)
+    return SingleFlight(lock, wait_timeout=config.RAPIDAPI_FETCH_LOCK_TTL)
+
+
+# Recent results live in memory in front of the SQLite cache. Stale entries
+# are served immediately while a background thread refreshes them, and
+# concurrent misses for the same genre or query share one upstream request.
+movie_cache = TieredCache(
+    fetch_movie_recommendations,
+    load=get_cached_movies,
+    store=store_cached_movies,
+    max_entries=config.MOVIE_CACHE_MAX_ENTRIES,
+    soft_ttl=config.MOVIE_CACHE_SOFT_TTL,
+    hard_ttl=config.MOVIE_CACHE_HARD_TTL,
+    flight=make_flight('movies'),
+    negative_ttl=config.MOVIE_CACHE_NEGATIVE_TTL,
+    on_event=metrics.cache_observer('movies'),
+)
+search_cache = TieredCache(
+    fetch_search_results,
+    load=get_cached_search_results,
+    store=store_cached_search_results,
+    max_entries=config.SEARCH_CACHE_MAX_ENTRIES,
+    soft_ttl=config.MOVIE_CACHE_SOFT_TTL,
+    hard_ttl=config.MOVIE_CACHE_HARD_TTL,
+    flight=make_flight('search'),
+    negative_ttl=config.MOVIE_CACHE_NEGATIVE_TTL,
+    on_event=metrics.cache_observer('search'),
+)
+
+def prefetch_movie_recommendations(genres):
+    """Fetch several genres' lists in one concurrent batch and cache them; returns how many were stored."""
+    if not genres or not movie_api.configured:
+        return 0
+    stored = 0
+    bodies = movie_api.search_many([movie_search_params(genre) for genre in genres])
+    for genre, body in zip(genres, bodies):
+        movies = body.get('results', []) if body else None
+        if movies:
+            movie_cache.put(genre, movies)
+            stored += 1
+    return stored
+
+
+def warm_caches(limiter=None):
+    """
+    Refresh every genre list and the most popular searches that are missing
+    or will go stale within CACHE_WARM_LEAD seconds, so user requests find
+    them fresh.
+    """
+    limiter = limiter or RateLimiter(config.CACHE_WARM_RATE)
+    lead = config.CACHE_WARM_LEAD
+    flush_search_queries()
+
+    def due(cache, key):
+        expires_in = cache.expires_in(key)
+        return expires_in is None or expires_in <= lead
+
+    genres = [genre for genre in sorted(set(emotion_to_genre.values())) if due(movie_cache, genre)]
+    batch_size = max(1, config.RAPIDAPI_MAX_CONCURRENCY)
+    warmed_genres = 0
+    for i in range(0, len(genres), batch_size):
+        batch = genres[i:i + batch_size]
+        limiter.wait(len(batch))
+        warmed_genres += prefetch_movie_recommendations(batch)
+
+    queries = get_top_search_queries(config.CACHE_WARM_TOP_QUERIES, config.CACHE_WARM_QUERY_WINDOW)
+    warmed_queries = 0
+    for search_key in queries:
+        if due(search_cache, search_key):
+            limiter.wait()
+            warmed_queries += bool(search_cache.refresh(search_key))
+
+    return {'genres': warmed_genres, 'genres_due': len(genres), 'queries': warmed_queries}
+
+
+def claim_warm_pass():
+    """Only one worker warms per interval: whoever gets the lock row, which is left to expire."""
+    lock = SQLiteFlightLock(cache_db, 'warmer', ttl=config.CACHE_WARM_INTERVAL / 2)
+    return lock.acquire('pass')
+
+
+cache_warmer = PeriodicJob(
+    warm_caches,
+    interval=config.CACHE_WARM_INTERVAL,
+    jitter=config.CACHE_WARM_JITTER,
+    claim=claim_warm_pass,
+    name='cache-warmer',
+)
+
+
+def maintain_cache_db():
+    """
+    Write this worker's pending search counts, then keep the SQLite cache
+    bounded: drop rows expired for longer than
+    CACHE_DB_RETENTION, cap the number of search rows, shrink the search cache
+    until the database fits CACHE_DB_MAX_BYTES, prune old search counts and
+    stale locks, then refresh planner statistics (and VACUUM when due).
+    """
+    flush_search_queries()
+    now = int(time.time())
+    expired_before = now - config.CACHE_DB_RETENTION
+    deleted = {
+        'movie_cache': cache_db.evict('movie_cache', expired_before),
+        'search_cache': cache_db.evict('search_cache', expired_before, config.CACHE_DB_MAX_SEARCH_ROWS),
+    }
+    if config.CACHE_DB_MAX_BYTES:
+        deleted['search_cache'] += cache_db.shrink('search_cache', config.CACHE_DB_MAX_BYTES)
+    deleted['search_queries'] = cache_db.execute(
+        'DELETE FROM search_queries WHERE last_seen < ?',
+        (now - max(config.CACHE_WARM_QUERY_WINDOW, config.CACHE_DB_RETENTION),)).rowcount
+    deleted['flight_locks'] = cache_db.execute('DELETE FROM flight_locks WHERE expires_at < ?', (now,)).rowcount
+    if config.SEARCH_LOCAL_INDEX:
+        deleted['movie_titles'] = title_index.trim(config.CACHE_DB_MAX_TITLES)
+
+    vacuum = bool(config.CACHE_DB_VACUUM_INTERVAL) and SQLiteFlightLock(
+        cache_db, 'vacuum', ttl=config.CACHE_DB_VACUUM_INTERVAL).acquire('pass')
+    cache_db.optimize(vacuum=vacuum)
+    return {'deleted': deleted, 'vacuumed': vacuum, 'size_bytes': cache_db.size_bytes()}
+
+
+def claim_maintenance_pass():
+    lock = SQLiteFlightLock(cache_db, 'maintenance', ttl=config.CACHE_DB_MAINTENANCE_INTERVAL / 2)
+    return lock.acquire('pass')
+
+
+def run_cache_maintenance():
+    """Every worker flushes its search counts each pass; one of them also maintains the database."""
+    if claim_maintenance_pass():
+        return maintain_cache_db()
+    return {'search_queries_flushed': flush_search_queries()}
+
+
+cache_maintenance = PeriodicJob(
+    run_cache_maintenance,
+    interval=config.CACHE_DB_MAINTENANCE_INTERVAL,
+    name='cache-maintenance',
+)
 
-    movies = []
-    if 'results' in data:
-        for movie in data['results']:
-            if not isinstance(movie, dict):
-                continue
-            primary_title = movie.get('primaryTitle')
-            if not primary_title:
-                continue
-            description = movie.get('description', 'No description available.')
-            primary_image = movie.get('primaryImage', None)
-            trailer_url = movie.get('trailerUrl', None)
-
-            if description and len(description) > 100:
-                description = description[:97] + '...'
-
-            if primary_image and description:
-                movies.append({
-                    'primaryTitle': primary_title,
-                    'description': description,
-                    'primaryImage': primary_image,
-                    'trailerUrl': trailer_url or f"https://www.youtube.com/results?search_query={primary_title.replace(' ', '+')}+trailer"
-                })
-
-    store_cached_search_results(search_query, movies)
-
-    return jsonify({'movies': movies})
 
 @app.route("/auth/callback")
 def auth_callback():
@@ -642,22 +1159,181 @@ def home():
     if 'user' not in session:
         flash("You need to log in first.", "warning")
         return redirect(url_for('login'))
+    if config.AUTH_VERIFY_SESSIONS and not session_still_valid():
+        session.clear()
+        flash("Your session has expired. Please log in again.", "warning")
+        return redirect(url_for('login'))
     return render_template('home.html', user=session['user'])
 
 
+def session_still_valid():
+    """
+    Check the session's Supabase access token (cached by auth_client for a
+    few minutes). Only a token Supabase rejects ends the session; if auth is
+    unreachable the signed session is trusted.
+    """
+    access_token = session.get('access_token')
+    if not access_token:
+        return True
+    try:
+        auth_client.get_user(access_token)
+    except AuthUnavailable:
+        return True
+    except Exception as e:
+        status = getattr(e, 'status', None)
+        if status in (401, 403):
+            return False
+        logger.warning("Could not verify session", extra={'event': 'session_verify_failed', 'error': str(e)})
+    return True
+
+
+@app.route('/stats')
+def stats():
+    """Counters for tuning the emotion detection and movie caches"""
+    service = model_warmup.value
+    frame_cache = service.frame_cache if service else None
+    face_tracker = service.face_tracker if service else None
+    status = {
+        'emotion_cache': frame_cache.stats() if frame_cache is not None else None,
+        'face_tracker': {
+            'tracked_frames': face_tracker.tracked_frames,
+            'detected_frames': face_tracker.detected_frames,
+        } if face_tracker is not None else None,
+        'movie_cache': movie_cache.stats(),
+        'search_cache': search_cache.stats(),
+        'blended_ranker': {**blended_ranker.stats(), 'payload_builds': blended_payloads.builds},
+        'cache_warmer': cache_warmer.status(),
+        'cache_maintenance': cache_maintenance.status(),
+        'session_sweeper': session_sweeper.status() if session_sweeper is not None else None,
+        'movie_api': movie_api_breaker.stats(),
+        'auth': auth_client.stats(),
+        'logging': logging_stats(),
+    }
+    return jsonify(status)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics, summed over every gunicorn worker"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
 @app.route('/health')
 def health_check():
     """Health check endpoint to diagnose authentication service status"""
+    init_supabase()
     status = {
         'supabase_configured': supabase_client is not None,
         'supabase_url_set': bool(getattr(config, 'SUPABASE_URL', None) or os.getenv('SUPABASE_URL')),
         'supabase_key_set': bool(getattr(config, 'SUPABASE_KEY', None) or os.getenv('SUPABASE_KEY')),
-        'init_error': supabase_init_error if supabase_init_error else None
+        'init_error': supabase_init_error if supabase_init_error else None,
+        'model': model_warmup.status(),
+        'movie_api_circuit': movie_api_breaker.state,
     }
     return jsonify(status)
 
 
+@app.route('/health/live')
+def liveness_check():
+    """Liveness probe: the worker is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness probe: the emotion model is loaded and can serve /detect_emotion"""
+    service = model_warmup.value
+    if service is None:
+        model_warmup.start()
+    model = model_warmup.status()
+    model['backend_available'] = bool(service and service.is_ready())
+    ready = model['state'] == 'loaded' and model['backend_available']
+    return jsonify({'ready': ready, 'model': model}), 200 if ready else 503
+
+
+@app.cli.command('check-backend-parity')
+@click.argument('fixture_dir')
+@click.option('--min-agreement', default=0.8, show_default=True,
+              help='Fail when fewer images than this share the same dominant emotion.')
+def check_backend_parity(fixture_dir, min_agreement):
+    """Check that the FER and ONNX backends agree on a folder of face images."""
+    from emotion_backends import FerBackend, OnnxBackend, compare_backends
+    from emotion_service import EMOTION_MAP
+    from frame_decode import decode_gray
+
+    frames = []
+    for name in sorted(os.listdir(fixture_dir)):
+        if not name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            continue
+        with open(os.path.join(fixture_dir, name), 'rb') as f:
+            gray = decode_gray(f.read())
+        if gray is not None:
+            frames.append((name, gray))
+    if not frames:
+        raise click.ClickException(f"No PNG/JPEG images found in {fixture_dir}")
+
+    reference = FerBackend()
+    candidate = OnnxBackend(config.EMOTION_ONNX_MODEL, config.EMOTION_ONNX_LABELS,
+                            config.EMOTION_ONNX_INPUT_SCALE, config.EMOTION_ONNX_THREADS)
+    report = compare_backends(reference, candidate, frames, EMOTION_MAP)
+    click.echo(json.dumps(report, indent=2))
+    if report['agreement'] is None:
+        raise click.ClickException("No image had a face found by both backends")
+    if report['agreement'] < min_agreement:
+        raise click.ClickException(
+            f"Backends agree on {report['agreement']:.0%} of images, expected at least {min_agreement:.0%}")
+
+
+@app.cli.command('warm-cache')
+def warm_cache_command():
+    """Refresh genre lists and popular searches that are about to expire (run from cron)."""
+    result = warm_caches()
+    click.echo(json.dumps(result))
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress static/ into ASSET_OUTPUT_DIR (also done when gunicorn starts)."""
+    click.echo(json.dumps(build_static_assets(), indent=2))
+
+
+@app.cli.command('maintain-cache')
+def maintain_cache_command():
+    """Evict expired and excess cache rows and optimize the cache database."""
+    click.echo(json.dumps(maintain_cache_db()))
+
+
+def start_periodic_jobs():
+    """
+    Start this process's background threads. A preloading gunicorn master
+    forks its workers without them, so gunicorn.conf.py's post_fork calls
+    this in every worker instead.
+    """
+    if session_sweeper is not None:
+        session_sweeper.start()
+    if config.CACHE_WARMER == 'thread':
+        cache_warmer.start()
+    if config.CACHE_DB_MAINTENANCE_INTERVAL:
+        cache_maintenance.start()
+
+
 init_db()
+init_user_store()
+if config.EMOTION_WARMUP != 'preload':
+    start_periodic_jobs()
+if config.EMOTION_WARMUP == 'preload':
+    # With gunicorn's preload_app the master loads the model once and forked
+    # workers share it. In process mode only the (empty) pool is built here:
+    # no model is loaded in the master, and gunicorn.conf.py's post_fork
+    # starts each worker's pool processes.
+    model_warmup.load_now(start_pool=False)
+elif config.EMOTION_WARMUP == 'background':
+    model_warmup.start()
+
 if __name__ == "__main__":
+    start_periodic_jobs()
+    if config.ASSET_BUILD_ON_START:
+        build_static_assets()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,235 @@
+"""
+Fingerprinted, precompressed static assets.
+
+``build_assets()`` copies everything under static/ (images, css/, js/) into
+the output directory as ``name.<content hash>.ext``, so the files can be
+cached for a year: a changed file gets a new name. Stylesheets have their
+``url()`` references rewritten to the fingerprinted names first, so a new
+image also renames the stylesheets using it. Text assets get ``.gz`` and
+(with the brotli package installed) ``.br`` siblings, and JPEG/PNG images a
+``.webp`` one encoded with OpenCV; each is kept only when it is smaller.
+``manifest.json`` maps every source name to its output name.
+
+Templates link assets with ``asset_url('css/home.css')``; ``send_asset()``
+picks the variant the client accepts (Accept-Encoding, Accept: image/webp).
+Without a manifest (nothing built yet) ``asset_url`` falls back to the plain
+/static/ file.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+
+from flask import request, send_file, url_for
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+TEXT_TYPES = ('.css', '.js', '.svg', '.json', '.txt')
+IMAGE_TYPES = ('.jpg', '.jpeg', '.png')
+IMMUTABLE = 'public, max-age={max_age}, immutable'
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def fingerprinted_name(name, data):
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{fingerprint(data)}{ext}'
+
+
+def rewrite_css_urls(css, name, manifest):
+    """Point url() references in the stylesheet ``name`` at the fingerprinted files in ``manifest``."""
+    base = posixpath.dirname(name)
+
+    def replace(match):
+        quote, ref = match.group(1), match.group(2).strip()
+        if ref.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', ref).groups()
+        target = posixpath.normpath(posixpath.join(base, path))
+        if target not in manifest:
+            return match.group(0)
+        return f'url({quote}{posixpath.relpath(manifest[target], base or ".")}{suffix}{quote})'
+
+    return _CSS_URL.sub(replace, css)
+
+
+def _write(path, data):
+    """Write ``data`` unless the (content-addressed) file is already there."""
+    if os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+
+def _compressed_variants(path, data, min_size):
+    if len(data) < min_size:
+        return
+    if not os.path.exists(path + '.gz'):
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(gz) < len(data):
+            _write(path + '.gz', gz)
+    if brotli is not None and not os.path.exists(path + '.br'):
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            _write(path + '.br', br)
+
+
+def _webp_variant(path, data, quality):
+    if os.path.exists(posixpath.splitext(path)[0] + '.webp'):
+        return
+    import cv2
+    import numpy as np
+
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return
+    ok, encoded = cv2.imencode('.webp', image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    if ok and len(encoded) < len(data):
+        _write(posixpath.splitext(path)[0] + '.webp', encoded.tobytes())
+
+
+def _source_files(source_dir, output_dir):
+    skip = os.path.abspath(output_dir)
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and os.path.abspath(os.path.join(root, d)) != skip)
+        for filename in sorted(files):
+            if not filename.startswith('.'):
+                path = os.path.join(root, filename)
+                yield os.path.relpath(path, source_dir).replace(os.sep, '/'), path
+
+
+def build_assets(source_dir, output_dir, webp_quality=80, min_compress_size=512):
+    """
+    Fingerprint and precompress every file under ``source_dir`` into
+    ``output_dir`` and write its manifest. Files already built are left
+    alone, as are older builds' files (pages cached before a deploy may still
+    ask for them). Returns the manifest.
+    """
+    sources = dict(_source_files(source_dir, output_dir))
+    manifest = {}
+    written = 0
+    # Stylesheets last: their url()s need the other files' names.
+    for name in sorted(sources, key=lambda n: (n.endswith('.css'), n)):
+        with open(sources[name], 'rb') as f:
+            data = f.read()
+        if name.endswith('.css'):
+            data = rewrite_css_urls(data.decode('utf-8'), name, manifest).encode('utf-8')
+        output_name = fingerprinted_name(name, data)
+        path = os.path.join(output_dir, *output_name.split('/'))
+        written += _write(path, data)
+        ext = posixpath.splitext(name)[1].lower()
+        if ext in TEXT_TYPES:
+            _compressed_variants(path, data, min_compress_size)
+        elif ext in IMAGE_TYPES and webp_quality:
+            _webp_variant(path, data, webp_quality)
+        manifest[name] = output_name
+
+    os.makedirs(output_dir, exist_ok=True)
+    tmp = os.path.join(output_dir, f'{MANIFEST}.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(output_dir, MANIFEST))
+    logger.info("Static assets built", extra={'event': 'assets_built', 'assets': len(manifest), 'written': written,
+                                              'brotli': brotli is not None})
+    return manifest
+
+
+class AssetManifest:
+    """The output names of the last build, read from ``output_dir`` on first use."""
+
+    def __init__(self, output_dir, endpoint='serve_asset'):
+        self.output_dir = output_dir
+        self.endpoint = endpoint
+        self._manifest = None
+        self._lock = threading.Lock()
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            with self._lock:
+                if self._manifest is None:
+                    self._manifest = self._load()
+        return self._manifest
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.output_dir, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            logger.warning("No static asset manifest; serving unfingerprinted files. Run `flask --app app build-assets`.",
+                           extra={'event': 'assets_missing'})
+        except ValueError as e:
+            logger.error("Unreadable static asset manifest", extra={'event': 'assets_missing', 'error': str(e)})
+        return {}
+
+    def reload(self):
+        with self._lock:
+            self._manifest = self._load()
+
+    def url(self, name):
+        output_name = self.manifest.get(name)
+        if output_name is None:
+            return url_for('static', filename=name)
+        return url_for(self.endpoint, filename=output_name)
+
+
+def _accepts_encoding(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def send_asset(output_dir, filename, max_age=31536000):
+    """
+    Serve a built asset with year-long immutable caching, choosing its WebP
+    or brotli/gzip variant when the client accepts one.
+    """
+    path = safe_join(output_dir, filename)
+    if path is None or filename.endswith(('.gz', '.br')) or not os.path.isfile(path):
+        raise NotFound()
+    ext = posixpath.splitext(filename)[1].lower()
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    vary = None
+
+    if ext in IMAGE_TYPES:
+        vary = 'Accept'
+        webp = posixpath.splitext(path)[0] + '.webp'
+        # Browsers that take WebP name it; "*/*" alone doesn't count.
+        if 'image/webp' in request.headers.get('Accept', '') and os.path.isfile(webp):
+            path, mimetype = webp, 'image/webp'
+    elif ext in TEXT_TYPES:
+        vary = 'Accept-Encoding'
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if _accepts_encoding(candidate) and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, candidate
+                break
+
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=max_age)
+    # send_file names the file it sent (e.g. "home.css.br"); the URL is name enough.
+    response.headers.pop('Content-Disposition', None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if vary:
+        response.vary.add(vary)
+    response.headers['Cache-Control'] = IMMUTABLE.format(max_age=max_age)
+    return response
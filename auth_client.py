@@ -0,0 +1,194 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AuthUnavailable(Exception):
+    """Raised when Supabase auth is saturated, too slow or not configured; callers should ask the user to retry."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _is_retryable(error):
+    """Network errors, 5xx and rate limiting are worth another try; other auth errors (bad password) are not."""
+    status = getattr(error, 'status', None)
+    if isinstance(status, int):
+        return status >= 500 or status == 429
+    return not isinstance(error, (ValueError, TypeError))
+
+
+def _failure_reason(error):
+    status = getattr(error, 'status', None)
+    if isinstance(status, int):
+        return f'http_{status // 100}xx'
+    return 'timeout' if 'Timeout' in type(error).__name__ else 'error'
+
+
+def _user_info(user):
+    return {
+        'id': user.id,
+        'email': user.email,
+        'user_metadata': user.user_metadata,
+    }
+
+
+class AuthClient:
+    """
+    Calls Supabase auth on a small thread pool instead of the request thread.
+
+    Each call gets ``timeout`` seconds in total: the request thread waits at
+    most that long, while the pool thread retries retryable failures with
+    jittered exponential backoff for as long as the deadline allows. At most
+    ``max_in_flight`` calls run at once; past that callers get
+    AuthUnavailable immediately rather than piling up.
+
+    Users verified by a sign-in or ``get_user`` are remembered by access
+    token for ``session_ttl`` seconds (never past the token's own expiry),
+    so checking the same session again doesn't call Supabase.
+    """
+
+    def __init__(self, get_client, timeout=8.0, retries=2, backoff_base=0.5, backoff_max=4.0,
+                 max_in_flight=4, session_ttl=300, session_cache_size=1024, retry_after=1):
+        self.get_client = get_client
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.session_ttl = session_ttl
+        self.session_cache_size = session_cache_size
+        self.retry_after = retry_after
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        self.calls = 0
+        self.retried = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.session_hits = 0
+        self.session_misses = 0
+
+    def _ensure_executor(self):
+        # Executor threads don't survive a fork, so every gunicorn worker gets its own.
+        if self._executor is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='supabase-auth')
+            self._slots = threading.BoundedSemaphore(self.max_in_flight)
+            self._pid = os.getpid()
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _with_retries(self, fn, deadline):
+        attempt = 0
+        while True:
+            try:
+                with metrics.upstream_call('supabase_auth'):
+                    return fn()
+            except Exception as e:
+                metrics.upstream_error('supabase_auth', _failure_reason(e))
+                delay = self._backoff(attempt)
+                if attempt >= self.retries or not _is_retryable(e) or time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning("Supabase auth call failed; retrying",
+                               extra={'event': 'auth_retry', 'error': str(e), 'delay': round(delay, 2)})
+                self.retried += 1
+                attempt += 1
+                time.sleep(delay)
+
+    def _call(self, fn):
+        client = self.get_client()
+        if client is None:
+            raise AuthUnavailable("Authentication service is not configured", self.retry_after)
+        self._ensure_executor()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self.rejected += 1
+            metrics.upstream_error('supabase_auth', 'rejected')
+            raise AuthUnavailable("Too many sign-ins in progress", self.retry_after)
+        deadline = time.monotonic() + self.timeout
+        try:
+            future = self._executor.submit(self._with_retries, lambda: fn(client.auth), deadline)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        self.calls += 1
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.timed_out += 1
+            metrics.upstream_error('supabase_auth', 'deadline')
+            raise AuthUnavailable("Authentication service timed out", self.retry_after)
+
+    def sign_up(self, email, password):
+        return self._call(lambda auth: auth.sign_up({"email": email, "password": password}))
+
+    def sign_in(self, email, password):
+        response = self._call(lambda auth: auth.sign_in_with_password({"email": email, "password": password}))
+        auth_session = getattr(response, 'session', None)
+        user = getattr(response, 'user', None)
+        if auth_session is not None and user is not None:
+            self._remember(auth_session.access_token, _user_info(user), getattr(auth_session, 'expires_in', None))
+        return response
+
+    def resend_confirmation(self, email):
+        return self._call(lambda auth: auth.api.resend_confirmation(email))
+
+    def get_user(self, access_token):
+        """
+        The user behind ``access_token``, from the cache when it was verified
+        recently. Raises the auth error when Supabase rejects the token.
+        """
+        now = time.monotonic()
+        with self._sessions_lock:
+            entry = self._sessions.get(access_token)
+            if entry is not None and entry[0] > now:
+                self._sessions.move_to_end(access_token)
+                self.session_hits += 1
+                return entry[1]
+            self.session_misses += 1
+        response = self._call(lambda auth: auth.get_user(access_token))
+        info = _user_info(response.user)
+        self._remember(access_token, info)
+        return info
+
+    def forget(self, access_token):
+        with self._sessions_lock:
+            self._sessions.pop(access_token, None)
+
+    def _remember(self, access_token, info, expires_in=None):
+        ttl = self.session_ttl if expires_in is None else min(self.session_ttl, expires_in)
+        with self._sessions_lock:
+            self._sessions[access_token] = (time.monotonic() + ttl, info)
+            self._sessions.move_to_end(access_token)
+            while len(self._sessions) > self.session_cache_size:
+                self._sessions.popitem(last=False)
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'retried': self.retried,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'session_cache_hits': self.session_hits,
+            'session_cache_misses': self.session_misses,
+            'cached_sessions': len(self._sessions),
+        }
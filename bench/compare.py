@@ -0,0 +1,98 @@
+"""
+Compare two bench/run.py reports and fail on regressions.
+
+For every load scenario present in both reports, throughput may not drop and
+p50/p95/p99 latency and the error rate may not rise by more than
+``--tolerance`` (a fraction); for every micro-benchmark stage the same goes
+for its p50. Exits with status 1 when anything regressed, so CI can run
+
+    python bench/run.py --output bench/results/current.json
+    python bench/compare.py bench/results/baseline.json bench/results/current.json
+
+Latencies below ``--min-latency-ms`` / ``--min-stage-us`` in the baseline are
+too small to compare reliably and are only reported.
+"""
+import argparse
+import json
+import sys
+
+LOAD_LATENCIES = ('p50', 'p95', 'p99')
+
+
+def change(baseline, current):
+    if not baseline:
+        return None
+    return (current - baseline) / baseline
+
+
+def compare_load(baseline, current, tolerance, min_latency_ms):
+    rows = []
+    for name, base in baseline.get('load', {}).items():
+        cur = current.get('load', {}).get(name)
+        if not cur or 'skipped' in base or 'skipped' in cur:
+            continue
+        rows.append((f'{name} throughput_rps', base['throughput_rps'], cur['throughput_rps'],
+                     change(base['throughput_rps'], cur['throughput_rps']) < -tolerance))
+        for key in LOAD_LATENCIES:
+            before, after = base['latency_ms'][key], cur['latency_ms'][key]
+            rows.append((f'{name} {key}_ms', before, after,
+                         before >= min_latency_ms and change(before, after) > tolerance))
+        before = base['errors'] / base['requests']
+        after = cur['errors'] / cur['requests']
+        rows.append((f'{name} error_rate', before, after, after > before + tolerance * max(before, 0.01)))
+    return rows
+
+
+def compare_micro(baseline, current, tolerance, min_stage_us):
+    rows = []
+    base_images = (baseline.get('micro') or {}).get('images', {})
+    cur_images = (current.get('micro') or {}).get('images', {})
+    for image, base in base_images.items():
+        cur = cur_images.get(image)
+        if not cur:
+            continue
+        for stage, base_stage in base['stages'].items():
+            cur_stage = cur['stages'].get(stage)
+            if not cur_stage:
+                continue
+            before, after = base_stage['latency_us']['p50'], cur_stage['latency_us']['p50']
+            rows.append((f'{image} {stage} p50_us', before, after,
+                         before >= min_stage_us and change(before, after) > tolerance))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two bench/run.py reports.')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Allowed relative slowdown before it counts as a regression (default 0.15).')
+    parser.add_argument('--min-latency-ms', type=float, default=1.0)
+    parser.add_argument('--min-stage-us', type=float, default=20.0)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows = (compare_load(baseline, current, args.tolerance, args.min_latency_ms)
+            + compare_micro(baseline, current, args.tolerance, args.min_stage_us))
+    if not rows:
+        print("Nothing to compare: the reports share no scenarios or stages.")
+        return 1
+
+    width = max(len(row[0]) for row in rows)
+    regressions = 0
+    for name, before, after, regressed in rows:
+        delta = change(before, after)
+        delta_text = f'{delta:+.1%}' if delta is not None else 'n/a'
+        regressions += regressed
+        print(f"{name:<{width}}  {before:>12.3f}  {after:>12.3f}  {delta_text:>8}{'  REGRESSION' if regressed else ''}")
+    print(f"{regressions} regression(s) beyond {args.tolerance:.0%} "
+          f"({baseline['meta'].get('git_revision')} -> {current['meta'].get('git_revision')})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Regenerate the synthetic frames in bench/fixtures/faces/.
+
+They are drawn rather than photographed so the suite can ship without
+anyone's likeness: a lit face shape (eyes, brows, mouth) on a noisy
+background, at webcam and larger sizes, as JPEG and PNG. They exercise
+decoding, resizing and face detection; classification of a drawn face is
+not meaningful, so compare timings, not emotions.
+
+    python bench/fixtures/make_faces.py
+"""
+import os
+
+import cv2
+import numpy as np
+
+OUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'faces')
+
+# (file name, width, height, mouth curve: >0 smile, <0 frown, 0 open)
+FRAMES = [
+    ('smile_640x480.jpg', 640, 480, 1),
+    ('frown_640x480.jpg', 640, 480, -1),
+    ('open_640x480.jpg', 640, 480, 0),
+    ('smile_1280x960.jpg', 1280, 960, 1),
+    ('neutral_320x240.png', 320, 240, 0.2),
+]
+
+
+def draw_face(width, height, mouth, seed):
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(50, 110, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 6, (height, width, 3)).astype(np.float32)
+    image = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+    cx, cy = width // 2, height // 2
+    fw, fh = width // 6, height // 4
+    cv2.ellipse(image, (cx, cy), (fw, fh), 0, 0, 360, (140, 170, 210), -1)
+    eye_y = cy - fh // 4
+    for ex in (cx - fw // 2, cx + fw // 2):
+        cv2.ellipse(image, (ex, eye_y), (fw // 6, fh // 12), 0, 0, 360, (250, 250, 250), -1)
+        cv2.circle(image, (ex, eye_y), max(2, fh // 14), (40, 30, 20), -1)
+        cv2.line(image, (ex - fw // 5, eye_y - fh // 6), (ex + fw // 5, eye_y - fh // 6), (50, 40, 30), max(2, fh // 30))
+    cv2.line(image, (cx, eye_y + fh // 10), (cx - fw // 10, cy + fh // 6), (110, 130, 170), max(2, fh // 40))
+    mouth_y = cy + fh // 2
+    if mouth == 0:
+        cv2.ellipse(image, (cx, mouth_y), (fw // 4, fh // 8), 0, 0, 360, (60, 40, 120), -1)
+    else:
+        start, end = (0, 180) if mouth > 0 else (180, 360)
+        cv2.ellipse(image, (cx, mouth_y - (fh // 10 if mouth > 0 else -fh // 10)),
+                    (fw // 3, int(fh // 6 * abs(mouth)) + 1), 0, start, end, (60, 40, 120), max(3, fh // 25))
+    return cv2.GaussianBlur(image, (5, 5), 0)
+
+
+def main():
+    os.makedirs(OUT_DIR, exist_ok=True)
+    for seed, (name, width, height, mouth) in enumerate(FRAMES):
+        path = os.path.join(OUT_DIR, name)
+        params = [cv2.IMWRITE_JPEG_QUALITY, 85] if name.endswith('.jpg') else []
+        cv2.imwrite(path, draw_face(width, height, mouth, seed), params)
+        print(path, os.path.getsize(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""
+Offline load test of the hot endpoints plus micro-benchmarks of the emotion
+detection stages, written out as JSON for bench/compare.py.
+
+By default the app is imported in this process with RapidAPI pointed at
+bench/stubs.RapidApiStub and Supabase replaced by FakeSupabaseClient, served
+by a threaded werkzeug server on a free port, and driven by ``--concurrency``
+client threads. Nothing leaves the machine. Caches, users and sessions live
+in a temporary directory, so every run starts cold.
+
+    python bench/run.py --concurrency 8 --requests 400
+    python bench/run.py --scenarios get_movies,search_movie --no-micro
+
+``--url`` drives an already running server instead (start it against
+``python bench/stubs.py``; /login then needs real credentials, so leave it
+out of ``--scenarios``). /detect_emotion is skipped, with the reason in the
+report, when the server has no emotion backend; so are the classifier
+micro-benchmarks.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stubs import BENCH_PASSWORD, FIXTURES, FakeSupabaseClient, RapidApiStub, load_movies  # noqa: E402
+
+SCENARIOS = ('detect_emotion', 'get_movies', 'search_movie', 'login')
+EMOTIONS = ('happy', 'sad', 'anger', 'fear', 'surprise', 'neutral', 'disgust')
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    if not ordered:
+        return None
+    return {
+        'mean': statistics.fmean(ordered),
+        'p50': percentile(ordered, 50),
+        'p95': percentile(ordered, 95),
+        'p99': percentile(ordered, 99),
+        'max': ordered[-1],
+    }
+
+
+def load_faces():
+    faces = []
+    face_dir = os.path.join(FIXTURES, 'faces')
+    for name in sorted(os.listdir(face_dir)):
+        if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            with open(os.path.join(face_dir, name), 'rb') as f:
+                faces.append((name, f.read()))
+    return faces
+
+
+def search_prefixes(movies):
+    """Two- to four-letter prefixes of the fixture titles, the way autocomplete sends them."""
+    prefixes = []
+    for movie in movies:
+        word = movie['primaryTitle'].split()[0].lower()
+        prefixes.extend(word[:n] for n in (2, 3, 4) if len(word) >= n)
+    return sorted(set(prefixes))
+
+
+def scenario_requests(name, faces, prefixes):
+    """An endless iterator of (method, path, requests kwargs, ok statuses) for one scenario."""
+    if name == 'detect_emotion':
+        for face_name, data in itertools.cycle(faces):
+            mimetype = 'image/png' if face_name.endswith('.png') else 'image/jpeg'
+            yield 'POST', '/detect_emotion', {'files': {'image': (face_name, data, mimetype)}}, (200,)
+    elif name == 'get_movies':
+        for emotion in itertools.cycle(EMOTIONS):
+            yield 'GET', '/get_movies', {'params': {'emotion': emotion}}, (200,)
+    elif name == 'search_movie':
+        for prefix in itertools.cycle(prefixes):
+            yield 'GET', '/search_movie', {'params': {'query': prefix}}, (200,)
+    elif name == 'login':
+        for i in itertools.count():
+            data = {'email': f'bench{i % 1000}@example.com', 'password': BENCH_PASSWORD}
+            # A successful login redirects to /home; a failed one re-renders the form with 200.
+            yield 'POST', '/login', {'data': data, 'allow_redirects': False}, (302,)
+    else:
+        raise ValueError(f"Unknown scenario: {name}")
+
+
+def run_load(base_url, name, requests_iter, total, concurrency, warmup):
+    """
+    Send ``warmup`` unmeasured requests, then ``total`` measured ones from
+    ``concurrency`` threads, each with its own keep-alive connection.
+    """
+    lock = threading.Lock()
+    local = threading.local()
+
+    def next_request():
+        with lock:
+            return next(requests_iter)
+
+    def send():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        method, path, kwargs, ok = next_request()
+        start = time.perf_counter()
+        try:
+            response = local.session.request(method, base_url + path, timeout=60, **kwargs)
+            response.content
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return time.perf_counter() - start, status, status in ok
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f'bench-{name}') as pool:
+        list(pool.map(lambda _: send(), range(warmup)))
+        started = time.perf_counter()
+        results = list(pool.map(lambda _: send(), range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [seconds * 1000.0 for seconds, _, _ in results]
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'throughput_rps': total / elapsed if elapsed else None,
+        'errors': sum(1 for _, _, ok in results if not ok),
+        'statuses': dict(Counter(str(status) for _, status, _ in results)),
+        'latency_ms': summarize(latencies),
+    }
+
+
+def emotion_backend_ready(base_url):
+    try:
+        response = requests.get(base_url + '/health/ready', timeout=60)
+    except requests.RequestException as e:
+        return False, f"readiness check failed: {e}"
+    if response.status_code == 200:
+        return True, None
+    model = response.json().get('model', {})
+    return False, f"emotion backend not available (model state {model.get('state')!r}, error {model.get('error')!r})"
+
+
+def time_stage(fn, iterations):
+    fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    summary = summarize(samples)
+    return {'iterations': iterations, 'latency_us': summary}
+
+
+def run_micro(faces, iterations):
+    """
+    Time each stage detect_emotion() goes through, per fixture image: header
+    parse, full-size decode (for reference), reduced decode + resize
+    (decode_gray), face detection, crop extraction, the frame-cache hash of
+    the face crop and classification. Stages needing a backend are skipped
+    without one.
+    """
+    import cv2
+    import numpy as np
+
+    import emotion_service
+    from emotion_backends import load_backend
+    from emotion_engine import extract_face_crops
+    from frame_cache import face_hash
+    from frame_decode import decode_gray, fit_within, image_size
+
+    try:
+        backend = load_backend(**emotion_service.EMOTION_BACKEND_OPTIONS)
+        backend_error = None
+    except Exception as e:
+        backend = None
+        backend_error = f"{type(e).__name__}: {e}"
+
+    report = {'backend': backend.name if backend else None, 'backend_error': backend_error, 'images': {}}
+    for name, data in faces:
+        gray = decode_gray(data)
+        full = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        stages = {
+            'image_size': time_stage(lambda: image_size(data), iterations),
+            'imdecode_full': time_stage(lambda: cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE),
+                                        iterations),
+            'decode_gray': time_stage(lambda: decode_gray(data), iterations),
+            'fit_within': time_stage(lambda: fit_within(full), iterations),
+        }
+        if backend is not None:
+            boxes = backend.find_faces(gray)
+            stages['face_detect'] = time_stage(lambda: backend.find_faces(gray), iterations)
+            if len(boxes):
+                _, crops = extract_face_crops(gray, boxes)
+                stages['extract_face_crops'] = time_stage(lambda: extract_face_crops(gray, boxes), iterations)
+                stages['face_hash'] = time_stage(lambda: face_hash(gray, boxes[0]), iterations)
+                stages['classify'] = time_stage(lambda: backend.classify(crops), iterations)
+        report['images'][name] = {'shape': list(gray.shape), 'stages': stages}
+    return report
+
+
+def start_offline_app(args, workdir):
+    """Import the app against the stubs and serve it on a free local port; returns (base_url, stop)."""
+    stub = RapidApiStub(latency=args.rapidapi_latency_ms / 1000.0).start()
+    os.environ.update({
+        'RAPIDAPI_KEY': 'bench',
+        'RAPIDAPI_HOST': 'bench',
+        'RAPIDAPI_URL': stub.url,
+        'SUPABASE_URL': '',
+        'SUPABASE_KEY': '',
+        'FLASK_SECRET_KEY': 'bench-secret',
+        'CACHE_WARMER': 'off',
+    })
+    os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    os.environ.setdefault('EMOTION_WARMUP', 'preload')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.chdir(workdir)
+
+    import app as app_module
+    from werkzeug.serving import make_server
+
+    # werkzeug logs every request at INFO unless its logger has a level.
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    app_module.supabase_client = FakeSupabaseClient(latency=args.auth_latency_ms / 1000.0)
+    app_module.supabase_initialized = True
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='bench-server', daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        stub.stop()
+
+    return f'http://127.0.0.1:{server.server_port}', stop
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='Comma-separated endpoints to load test (default: all).')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400, help='Measured requests per scenario.')
+    parser.add_argument('--warmup', type=int, default=40, help='Unmeasured requests sent first.')
+    parser.add_argument('--rapidapi-latency-ms', type=float, default=100)
+    parser.add_argument('--auth-latency-ms', type=float, default=50)
+    parser.add_argument('--micro-iterations', type=int, default=200)
+    parser.add_argument('--no-micro', action='store_true', help='Skip the detect_emotion() stage benchmarks.')
+    parser.add_argument('--url', help='Benchmark this running server instead of an in-process one.')
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results', 'latest.json'),
+                        help='Where to write the JSON report (default: bench/results/latest.json).')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+    output = os.path.abspath(args.output)
+    faces = load_faces()
+    prefixes = search_prefixes(load_movies())
+
+    workdir = tempfile.TemporaryDirectory(prefix='emotionpix-bench-')
+    stop = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        base_url, stop = start_offline_app(args, workdir.name)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'target': args.url or 'in-process',
+            'options': {key: value for key, value in vars(args).items() if key != 'output'},
+        },
+        'load': {},
+        'micro': None,
+    }
+    try:
+        for name in scenarios:
+            if name == 'detect_emotion':
+                ready, reason = emotion_backend_ready(base_url)
+                if not ready:
+                    report['load'][name] = {'skipped': reason}
+                    print(f"{name}: skipped ({reason})", file=sys.stderr)
+                    continue
+            result = run_load(base_url, name, scenario_requests(name, faces, prefixes),
+                              args.requests, args.concurrency, args.warmup)
+            report['load'][name] = result
+            latency = result['latency_ms']
+            print(f"{name}: {result['throughput_rps']:.1f} req/s, p50 {latency['p50']:.1f} ms, "
+                  f"p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms, {result['errors']} errors",
+                  file=sys.stderr)
+        if not args.no_micro:
+            report['micro'] = run_micro(faces, args.micro_iterations)
+    finally:
+        if stop is not None:
+            stop()
+        os.chdir(REPO_DIR)
+        workdir.cleanup()
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+    print(f"Report written to {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Per-request session overhead of each session backend.
+
+Builds a minimal Flask app per backend, logs in once (storing a dict shaped
+like the app's ``session['user']``), then times what every later request
+pays for its session: the backend's open_session() with the login cookie,
+reading ``session['user']`` and save_session(). The best of a few rounds is
+reported, along with the cookie size.
+
+    python bench/session_backends.py --requests 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from flask import Flask, session
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cache_store import CacheDatabase  # noqa: E402
+from session_store import SQLiteSessionInterface  # noqa: E402
+
+USER = {
+    'id': '5f0c9a1e-4b7d-4a57-9d38-1c2b3a4d5e6f',
+    'email': 'someone@example.com',
+    'user_metadata': {'email_verified': True},
+}
+
+
+def make_app(backend, workdir):
+    app = Flask(__name__)
+    app.secret_key = 'bench-secret'
+    if backend == 'sqlite':
+        interface = SQLiteSessionInterface(CacheDatabase(os.path.join(workdir, 'sessions.db')))
+        interface.create_table()
+        app.session_interface = interface
+    elif backend == 'filesystem':
+        from flask_session import Session
+        app.config['SESSION_TYPE'] = 'filesystem'
+        app.config['SESSION_FILE_DIR'] = os.path.join(workdir, 'flask_session')
+        Session(app)
+
+    @app.route('/login')
+    def login():
+        session['user'] = USER
+        return 'ok'
+
+    return app
+
+
+def run(backend, requests, workdir, rounds=3):
+    app = make_app(backend, workdir)
+    client = app.test_client()
+    client.get('/login')
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+    interface = app.session_interface
+    response = app.response_class('ok')
+
+    best = float('inf')
+    with app.test_request_context('/', headers={'Cookie': f'{cookie.key}={cookie.value}'}) as ctx:
+        for round_number in range(rounds + 1):
+            start = time.perf_counter()
+            for _ in range(requests):
+                current = interface.open_session(app, ctx.request)
+                assert current['user']['email'] == USER['email']
+                interface.save_session(app, current, response)
+            if round_number:  # the first round only warms up
+                best = min(best, time.perf_counter() - start)
+    return {'backend': backend, 'us_per_request': best / requests * 1e6, 'cookie_bytes': len(cookie.value)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--backends', default='cookie,sqlite,filesystem')
+    args = parser.parse_args()
+
+    print(f"{'backend':<12}{'us/request':>12}{'cookie':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in args.backends.split(','):
+            try:
+                result = run(backend, args.requests, workdir)
+            except ImportError as e:
+                print(f"{backend:<12}skipped: {e}")
+                continue
+            print(f"{result['backend']:<12}{result['us_per_request']:>12.1f}{result['cookie_bytes']:>10}")
+
+
+if __name__ == '__main__':
+    main()
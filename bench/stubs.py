@@ -0,0 +1,160 @@
+"""
+Offline stand-ins for the app's upstream services.
+
+``RapidApiStub`` is a local HTTP server that answers imdb236 search requests
+from bench/fixtures/imdb236/movies.json, filtering by genre or title prefix
+the way the real API does, after a configurable delay. ``FakeSupabaseClient``
+has the parts of the Supabase client the app uses (``auth.sign_up``,
+``auth.sign_in_with_password``, ``auth.get_user``) and accepts any email
+with the password ``BENCH_PASSWORD``.
+
+Run the stub on its own to benchmark a separately started server:
+
+    python bench/stubs.py --port 8765 --latency-ms 100
+    RAPIDAPI_URL=http://127.0.0.1:8765/api/imdb/search RAPIDAPI_KEY=x RAPIDAPI_HOST=x gunicorn ...
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import types
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BENCH_PASSWORD = 'Bench-Passw0rd!'
+
+
+def load_movies():
+    with open(os.path.join(FIXTURES, 'imdb236', 'movies.json')) as f:
+        return json.load(f)
+
+
+def search_movies(movies, params):
+    """The subset of ``movies`` an imdb236 search with ``params`` (parsed query string) returns."""
+    results = movies
+    genre = params.get('genre', [None])[0]
+    if genre:
+        results = [movie for movie in results if genre in movie['genres']]
+    prefix = params.get('primaryTitleAutocomplete', [None])[0]
+    if prefix:
+        prefix = prefix.lower()
+        results = [movie for movie in results
+                   if movie['primaryTitle'].lower().startswith(prefix)
+                   or any(word.startswith(prefix) for word in movie['primaryTitle'].lower().split())]
+    rows = int(params.get('rows', ['100'])[0])
+    return results[:rows]
+
+
+class RapidApiStub:
+    """A threaded HTTP server replaying canned imdb236 responses on 127.0.0.1."""
+
+    def __init__(self, port=0, latency=0.1, movies=None):
+        self.latency = latency
+        self.movies = movies if movies is not None else load_movies()
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                url = urlparse(self.path)
+                body = json.dumps({'results': search_movies(stub.movies, parse_qs(url.query))}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}/api/imdb/search'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='rapidapi-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class AuthApiError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class FakeSupabaseAuth:
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = 0
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _user(email):
+        return types.SimpleNamespace(id=str(uuid.uuid5(uuid.NAMESPACE_URL, email)), email=email,
+                                     user_metadata={'email_verified': True})
+
+    def sign_up(self, credentials):
+        self._wait()
+        return types.SimpleNamespace(user=self._user(credentials['email']), session=None)
+
+    def sign_in_with_password(self, credentials):
+        self._wait()
+        if credentials['password'] != BENCH_PASSWORD:
+            raise AuthApiError('Invalid login credentials', 400)
+        user = self._user(credentials['email'])
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[token] = user
+        session = types.SimpleNamespace(access_token=token, expires_in=3600)
+        return types.SimpleNamespace(error=None, user=user, session=session)
+
+    def get_user(self, jwt):
+        self._wait()
+        user = self._tokens.get(jwt)
+        if user is None:
+            raise AuthApiError('invalid JWT', 403)
+        return types.SimpleNamespace(user=user)
+
+
+class FakeSupabaseClient:
+    def __init__(self, latency=0.05):
+        self.auth = FakeSupabaseAuth(latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve canned imdb236 responses.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=100)
+    args = parser.parse_args()
+    stub = RapidApiStub(args.port, args.latency_ms / 1000.0)
+    print(f"RapidAPI stub at {stub.url}")
+    stub.server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
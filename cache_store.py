@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import threading
+
+
+class CacheDatabase:
+    """
+    The SQLite cache database, with one persistent connection per thread.
+
+    Connections are opened in autocommit mode with WAL journaling, so readers
+    in every gunicorn worker never block on a writer, and with
+    synchronous=NORMAL, an in-memory temp store, a larger page cache and
+    memory-mapped reads. A process forked from one that already connected
+    opens its own connections instead of sharing the parent's.
+    """
+
+    def __init__(self, path, busy_timeout_ms=5000, cache_size_kb=8192, mmap_size=64 * 1024 * 1024):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        return conn
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def add_columns(self, table, columns):
+        """Add any of ``columns`` ({name: type}) the table lacks; returns the names added."""
+        existing = {row[1] for row in self.execute(f'PRAGMA table_info({table})')}
+        added = []
+        for name, column_type in columns.items():
+            if name not in existing:
+                self.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+                added.append(name)
+        return added
+
+    def size_bytes(self):
+        """Bytes in use by live pages (free pages are reused before the file grows)."""
+        page_size = self.execute('PRAGMA page_size').fetchone()[0]
+        page_count = self.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = self.execute('PRAGMA freelist_count').fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def evict(self, table, expired_before, max_rows=None):
+        """
+        Delete rows whose expires_at is before ``expired_before``, then the
+        soonest-expiring rows beyond ``max_rows``. Returns how many went.
+        """
+        deleted = self.execute(f'DELETE FROM {table} WHERE expires_at < ?', (expired_before,)).rowcount
+        if max_rows is not None:
+            deleted += self.execute(f'''
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (max_rows,)).rowcount
+        return deleted
+
+    def shrink(self, table, max_bytes, fraction=0.1, max_rounds=10):
+        """Delete the soonest-expiring ``fraction`` of ``table`` until the database fits ``max_bytes``."""
+        deleted = 0
+        for _ in range(max_rounds):
+            if self.size_bytes() <= max_bytes:
+                break
+            rows = self.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            if not rows:
+                break
+            deleted += self.execute(f'''
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table} ORDER BY expires_at ASC LIMIT ?
+                )
+            ''', (max(1, int(rows * fraction)),)).rowcount
+        return deleted
+
+    def optimize(self, vacuum=False):
+        """Refresh planner statistics, checkpoint the WAL and optionally VACUUM."""
+        self.execute('ANALYZE')
+        self.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        if vacuum:
+            self.execute('VACUUM')
@@ -0,0 +1,75 @@
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a while.
+
+    ``failure_threshold`` consecutive failures open the circuit. While it is
+    open ``allow()`` is False, so callers fail fast instead of waiting for a
+    timeout. After ``reset_timeout`` seconds the circuit goes half-open and
+    lets ``half_open_max_calls`` trial calls through. A success closes it
+    again, and a failure re-opens it for another ``reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_calls = 0
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def allow(self):
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+                self._trial_calls += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == HALF_OPEN or (state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._failures,
+                'times_opened': self.opened,
+                'rejected_calls': self.rejected,
+            }
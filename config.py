@@ -11,21 +11,237 @@ FLASK_SECRET_KEY = os.getenv(
 # ===============================
 # Supabase Configuration
 # ===============================
+# Without them the app still starts (offline, e.g. for benchmarks); sign-up
+# and login report that authentication is unavailable.
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-# Fail fast if Supabase is not configured
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError(
-        "Supabase credentials not found. "
-        "Please set SUPABASE_URL and SUPABASE_KEY as environment variables."
-    )
+# Auth calls run off the request thread: a request waits at most AUTH_TIMEOUT
+# seconds, within which failed calls are retried AUTH_RETRIES times with
+# jittered exponential backoff. Beyond AUTH_MAX_IN_FLIGHT concurrent calls per
+# worker, sign-ins are turned away instead of queueing.
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", "8"))
+AUTH_CONNECT_TIMEOUT = float(os.getenv("AUTH_CONNECT_TIMEOUT", "3.05"))
+AUTH_READ_TIMEOUT = float(os.getenv("AUTH_READ_TIMEOUT", "5"))
+AUTH_RETRIES = int(os.getenv("AUTH_RETRIES", "2"))
+AUTH_BACKOFF_BASE = float(os.getenv("AUTH_BACKOFF_BASE", "0.5"))
+AUTH_BACKOFF_MAX = float(os.getenv("AUTH_BACKOFF_MAX", "4"))
+AUTH_MAX_IN_FLIGHT = int(os.getenv("AUTH_MAX_IN_FLIGHT", "4"))
+# With AUTH_VERIFY_SESSIONS=true, /home checks the session's Supabase access
+# token, remembering verified tokens for AUTH_SESSION_CACHE_TTL seconds.
+AUTH_VERIFY_SESSIONS = os.getenv("AUTH_VERIFY_SESSIONS", "false").lower() == "true"
+AUTH_SESSION_CACHE_TTL = float(os.getenv("AUTH_SESSION_CACHE_TTL", "300"))
+
+# ===============================
+# Local Users
+# ===============================
+# With LOCAL_AUTH=true, /register and /login use local accounts instead of
+# Supabase (no email confirmation). They live in their own SQLite database (a
+# users.json left by older versions is imported on startup). Password hashes
+# are checked on a small thread pool; sign-ins beyond PASSWORD_HASH_WORKERS +
+# PASSWORD_HASH_MAX_QUEUE, or waiting longer than PASSWORD_HASH_TIMEOUT
+# seconds, get a 503 with Retry-After.
+LOCAL_AUTH = os.getenv("LOCAL_AUTH", "false").lower() == "true"
+USER_DB_PATH = os.getenv("USER_DB_PATH", "users.db")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "8"))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "5"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+# ===============================
+# Sessions
+# ===============================
+# "cookie" (signed cookie, nothing stored server-side), "sqlite" (server-side
+# rows in SESSION_DB_PATH shared by all workers, expired rows swept every
+# SESSION_SWEEP_INTERVAL seconds) or "filesystem" (flask-session files).
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "cookie").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_TTL = int(os.getenv("SESSION_TTL", "604800"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "600"))
 
 # ===============================
 # RapidAPI Configuration (Movies)
 # ===============================
 RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY")
 RAPIDAPI_HOST = os.getenv("RAPIDAPI_HOST")
+# Point at a local stub (see bench/stubs.py) to run without the real API
+RAPIDAPI_URL = os.getenv("RAPIDAPI_URL", "https://imdb236.p.rapidapi.com/api/imdb/search")
+# RapidAPI calls reuse pooled keep-alive connections; connect and read
+# timeouts are separate so a slow handshake fails fast. Multi-genre fetches
+# run at most RAPIDAPI_MAX_CONCURRENCY requests at once.
+RAPIDAPI_CONNECT_TIMEOUT = float(os.getenv("RAPIDAPI_CONNECT_TIMEOUT", "3.05"))
+RAPIDAPI_READ_TIMEOUT = float(os.getenv("RAPIDAPI_READ_TIMEOUT", "5"))
+RAPIDAPI_POOL_SIZE = int(os.getenv("RAPIDAPI_POOL_SIZE", "10"))
+RAPIDAPI_MAX_CONCURRENCY = int(os.getenv("RAPIDAPI_MAX_CONCURRENCY", "4"))
+# After RAPIDAPI_FAILURE_THRESHOLD consecutive failures (timeouts, 5xx, 429)
+# RapidAPI isn't called for RAPIDAPI_RESET_TIMEOUT seconds; then one trial
+# call decides whether it is back.
+RAPIDAPI_FAILURE_THRESHOLD = int(os.getenv("RAPIDAPI_FAILURE_THRESHOLD", "5"))
+RAPIDAPI_RESET_TIMEOUT = float(os.getenv("RAPIDAPI_RESET_TIMEOUT", "30"))
+
+# Movie lists and search results are kept in memory (LRU, per worker) in
+# front of the SQLite cache. After the soft TTL a cached list is still served
+# while it is refreshed in the background; after the hard TTL it is refetched
+# before answering.
+MOVIE_CACHE_SOFT_TTL = int(os.getenv("MOVIE_CACHE_SOFT_TTL", "3600"))
+MOVIE_CACHE_HARD_TTL = int(os.getenv("MOVIE_CACHE_HARD_TTL", "86400"))
+MOVIE_CACHE_MAX_ENTRIES = int(os.getenv("MOVIE_CACHE_MAX_ENTRIES", "64"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512"))
+# Failed fetches and empty results are remembered this many seconds, so a
+# dead upstream or a query with no matches isn't retried on every request.
+# A failed fetch serves the last known good list for the key, however old.
+MOVIE_CACHE_NEGATIVE_TTL = int(os.getenv("MOVIE_CACHE_NEGATIVE_TTL", "30"))
+# Every movie fetched is added to a local full-text title index. A search
+# that finds at least SEARCH_LOCAL_MIN_RESULTS titles there by word prefix is
+# answered without calling RapidAPI; fuzzy (typo) matches, looked up only
+# below that, just fill the list.
+SEARCH_LOCAL_INDEX = os.getenv("SEARCH_LOCAL_INDEX", "true").lower() == "true"
+SEARCH_LOCAL_MIN_RESULTS = int(os.getenv("SEARCH_LOCAL_MIN_RESULTS", "5"))
+# Browser/CDN max-age (seconds) for /get_movies and /search_movie responses;
+# both also carry a strong ETag so clients can revalidate for a 304.
+MOVIES_MAX_AGE = int(os.getenv("MOVIES_MAX_AGE", "300"))
+SEARCH_MAX_AGE = int(os.getenv("SEARCH_MAX_AGE", "60"))
+# Page size for /get_movies and /search_movie when a client pages with
+# ?limit= / ?cursor= (without either, the whole list is returned).
+MOVIES_PAGE_SIZE = int(os.getenv("MOVIES_PAGE_SIZE", "12"))
+MOVIES_MAX_PAGE_SIZE = int(os.getenv("MOVIES_MAX_PAGE_SIZE", "100"))
+# /get_movies?scores=happy:0.6,sad:0.3,... ranks every cached movie by how
+# much of the score vector its genres cover, plus rating, vote count and
+# release year with these weights, and returns the best
+# RECOMMEND_MAX_RESULTS. RECOMMEND_MODE=genre ignores the scores and serves
+# the detected emotion's genre list as before.
+RECOMMEND_MODE = os.getenv("RECOMMEND_MODE", "blend").lower()
+RECOMMEND_MAX_RESULTS = int(os.getenv("RECOMMEND_MAX_RESULTS", "60"))
+RECOMMEND_RATING_WEIGHT = float(os.getenv("RECOMMEND_RATING_WEIGHT", "0.3"))
+RECOMMEND_VOTES_WEIGHT = float(os.getenv("RECOMMEND_VOTES_WEIGHT", "0.15"))
+RECOMMEND_YEAR_WEIGHT = float(os.getenv("RECOMMEND_YEAR_WEIGHT", "0.1"))
+
+# SQLite cache upkeep, run by one worker every CACHE_DB_MAINTENANCE_INTERVAL
+# seconds (0 turns the thread off; `flask --app app maintain-cache` does the
+# same from cron). Rows expired for longer than CACHE_DB_RETENTION are
+# deleted; until then they are served when RapidAPI is down. Search rows are
+# capped by count and by database size (CACHE_DB_MAX_BYTES, 0 for no cap),
+# and the title index keeps the CACHE_DB_MAX_TITLES most recently seen titles.
+# VACUUM runs at most once per CACHE_DB_VACUUM_INTERVAL seconds (0 never).
+# Searches are counted in memory and every worker writes its counts (for the
+# cache warmer) on each maintenance pass and before its own warming passes.
+CACHE_DB_MAINTENANCE_INTERVAL = float(os.getenv("CACHE_DB_MAINTENANCE_INTERVAL", "600"))
+CACHE_DB_RETENTION = int(os.getenv("CACHE_DB_RETENTION", str(7 * 86400)))
+CACHE_DB_MAX_SEARCH_ROWS = int(os.getenv("CACHE_DB_MAX_SEARCH_ROWS", "5000"))
+CACHE_DB_MAX_BYTES = int(os.getenv("CACHE_DB_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_DB_VACUUM_INTERVAL = float(os.getenv("CACHE_DB_VACUUM_INTERVAL", "0"))
+CACHE_DB_MAX_TITLES = int(os.getenv("CACHE_DB_MAX_TITLES", "50000"))
+# Concurrent requests for the same uncached genre/query always share one
+# RapidAPI call within a worker. With the shared fetch lock, workers also
+# coordinate through a lock row in the SQLite cache; the row expires after
+# RAPIDAPI_FETCH_LOCK_TTL seconds if its owner dies.
+RAPIDAPI_SHARED_FETCH_LOCK = os.getenv("RAPIDAPI_SHARED_FETCH_LOCK", "false").lower() == "true"
+RAPIDAPI_FETCH_LOCK_TTL = int(os.getenv("RAPIDAPI_FETCH_LOCK_TTL", "15"))
+
+# Cache warmer: refreshes every genre list and the CACHE_WARM_TOP_QUERIES
+# most frequent searches of the last CACHE_WARM_QUERY_WINDOW seconds before
+# they go stale. "thread" runs it inside the app every CACHE_WARM_INTERVAL
+# seconds (+/- CACHE_WARM_JITTER of that, one worker per pass); "off" leaves
+# it to `flask --app app warm-cache` from cron. Upstream calls are limited
+# to CACHE_WARM_RATE per second.
+CACHE_WARMER = os.getenv("CACHE_WARMER", "off").lower()
+CACHE_WARM_INTERVAL = float(os.getenv("CACHE_WARM_INTERVAL", "300"))
+CACHE_WARM_JITTER = float(os.getenv("CACHE_WARM_JITTER", "0.1"))
+CACHE_WARM_LEAD = float(os.getenv("CACHE_WARM_LEAD", "600"))
+CACHE_WARM_RATE = float(os.getenv("CACHE_WARM_RATE", "1"))
+CACHE_WARM_TOP_QUERIES = int(os.getenv("CACHE_WARM_TOP_QUERIES", "20"))
+CACHE_WARM_QUERY_WINDOW = int(os.getenv("CACHE_WARM_QUERY_WINDOW", "86400"))
+
+# ===============================
+# Emotion Inference
+# ===============================
+# Face crops from concurrent requests are classified together; a batch is
+# flushed when it is full or when the oldest crop has waited this long.
+EMOTION_BATCH_MAX_SIZE = int(os.getenv("EMOTION_BATCH_MAX_SIZE", "8"))
+EMOTION_BATCH_MAX_WAIT_MS = float(os.getenv("EMOTION_BATCH_MAX_WAIT_MS", "10"))
+EMOTION_INFERENCE_TIMEOUT = float(os.getenv("EMOTION_INFERENCE_TIMEOUT", "10"))
+EMOTION_BATCH_MAX_IMAGES = int(os.getenv("EMOTION_BATCH_MAX_IMAGES", "16"))
+
+# "thread" runs FER inside the web worker; "process" offloads it to a pool of
+# pre-warmed processes so slow frames don't hold up the other routes.
+EMOTION_EXECUTOR = os.getenv("EMOTION_EXECUTOR", "thread").lower()
+EMOTION_POOL_SIZE = int(os.getenv("EMOTION_POOL_SIZE", "2"))
+EMOTION_POOL_MAX_QUEUE = int(os.getenv("EMOTION_POOL_MAX_QUEUE", "8"))
+EMOTION_RETRY_AFTER = int(os.getenv("EMOTION_RETRY_AFTER", "1"))
+
+# Which model classifies emotions: "fer" (TensorFlow) or "onnx" (an exported
+# or int8-quantized model run with ONNX Runtime / OpenCV DNN on CPU). If the
+# ONNX model can't be loaded the app falls back to FER.
+EMOTION_BACKEND = os.getenv("EMOTION_BACKEND", "fer").lower()
+EMOTION_ONNX_MODEL = os.getenv("EMOTION_ONNX_MODEL", "models/emotion_model_int8.onnx")
+EMOTION_ONNX_LABELS = tuple(
+    label.strip() for label in
+    os.getenv("EMOTION_ONNX_LABELS", "angry,disgust,fear,happy,sad,surprise,neutral").split(",")
+)
+# "fer" for models expecting pixels in [-1, 1] (FER's own model), "raw" for 0-255
+EMOTION_ONNX_INPUT_SCALE = os.getenv("EMOTION_ONNX_INPUT_SCALE", "fer").lower()
+EMOTION_ONNX_THREADS = int(os.getenv("EMOTION_ONNX_THREADS", "1"))
+
+# Live streaming: frames are analysed at most this often, and the reported
+# scores are an exponential moving average with this smoothing factor.
+EMOTION_STREAM_FPS = float(os.getenv("EMOTION_STREAM_FPS", "5"))
+EMOTION_STREAM_ALPHA = float(os.getenv("EMOTION_STREAM_ALPHA", "0.3"))
+EMOTION_STREAM_IDLE_TIMEOUT = float(os.getenv("EMOTION_STREAM_IDLE_TIMEOUT", "30"))
+
+# Face tracking: consecutive frames from one session reuse the last face box
+# and skip face detection until the result looks unsure, the track is older
+# than FACE_TRACK_TTL seconds, or FACE_TRACK_REDETECT_EVERY frames have passed.
+FACE_TRACK_ENABLED = os.getenv("FACE_TRACK_ENABLED", "true").lower() == "true"
+FACE_TRACK_REDETECT_EVERY = int(os.getenv("FACE_TRACK_REDETECT_EVERY", "10"))
+FACE_TRACK_MIN_CONFIDENCE = float(os.getenv("FACE_TRACK_MIN_CONFIDENCE", "0.4"))
+FACE_TRACK_PADDING = float(os.getenv("FACE_TRACK_PADDING", "0.15"))
+FACE_TRACK_TTL = float(os.getenv("FACE_TRACK_TTL", "10"))
+
+# A signed-in caller's repeat capture (its face crop's dHash within
+# FRAME_CACHE_MAX_DISTANCE of 256 bits) reuses the previous detection result
+# for FRAME_CACHE_TTL seconds. Streams, batches and anonymous calls skip it.
+FRAME_CACHE_ENABLED = os.getenv("FRAME_CACHE_ENABLED", "true").lower() == "true"
+FRAME_CACHE_MAX_ENTRIES = int(os.getenv("FRAME_CACHE_MAX_ENTRIES", "256"))
+FRAME_CACHE_MAX_DISTANCE = int(os.getenv("FRAME_CACHE_MAX_DISTANCE", "2"))
+FRAME_CACHE_TTL = float(os.getenv("FRAME_CACHE_TTL", "5"))
+
+# ===============================
+# Startup
+# ===============================
+# How the emotion model is loaded:
+#   "background" - each worker starts loading it in a thread at boot
+#   "lazy"       - loaded by the first request that needs it
+#   "preload"    - loaded while importing the app; gunicorn.conf.py turns on
+#                  preload_app for this value, so the master loads it once
+#                  and forked workers share the memory
+EMOTION_WARMUP = os.getenv("EMOTION_WARMUP", "background").lower()
+# How long model-dependent routes wait for warm-up before answering 503
+EMOTION_WARMUP_WAIT = float(os.getenv("EMOTION_WARMUP_WAIT", "10"))
+
+# ===============================
+# Static Assets
+# ===============================
+# static/ is built into ASSET_OUTPUT_DIR as content-hashed files served from
+# /assets/ with year-long immutable caching, gzip/brotli and WebP variants
+# (`flask --app app build-assets`). With ASSET_BUILD_ON_START the gunicorn
+# master (or `python app.py`) builds them before serving.
+ASSET_OUTPUT_DIR = os.getenv("ASSET_OUTPUT_DIR", "static/dist")
+ASSET_BUILD_ON_START = os.getenv("ASSET_BUILD_ON_START", "true").lower() == "true"
+ASSET_WEBP_QUALITY = int(os.getenv("ASSET_WEBP_QUALITY", "80"))
+ASSET_MAX_AGE = int(os.getenv("ASSET_MAX_AGE", str(365 * 86400)))
+
+# ===============================
+# Logging
+# ===============================
+# Logs go to stdout as JSON lines ("text" for plain lines), written by a
+# background thread. LOG_SAMPLE_RATES keeps only a fraction of chatty events
+# ("event=rate,..."); warnings and errors are never sampled out.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "rapidapi_response=0.1,emotion_detected=0.1")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Log every face box and emotion score of every frame (very verbose)
+LOG_EMOTION_SCORES = os.getenv("LOG_EMOTION_SCORES", "false").lower() == "true"
 
 # ===============================
 # Environment Info
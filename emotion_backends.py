@@ -0,0 +1,183 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+from emotion_engine import FACE_TARGET_SIZE, analyze_gray, primary_face
+
+logger = logging.getLogger(__name__)
+
+# Label order of FER's bundled model, also the default for exported copies of it.
+FER_LABELS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+
+
+class EmotionBackend(ABC):
+    """
+    What the detection pipeline needs from an emotion model.
+
+    ``find_faces`` takes a grayscale frame and returns (x, y, w, h) boxes.
+    ``classify`` takes an (n, 64, 64) float32 array of face crops scaled to
+    [-1, 1] (see emotion_engine.extract_face_crops) and returns an (n, k)
+    array of probabilities in the order of ``labels``.
+    """
+
+    name = None
+    labels = {}
+
+    @abstractmethod
+    def find_faces(self, gray):
+        ...
+
+    @abstractmethod
+    def classify(self, faces):
+        ...
+
+
+class FerBackend(EmotionBackend):
+    """The original fer.FER(mtcnn=False) pipeline; pulls in TensorFlow."""
+
+    name = 'fer'
+
+    def __init__(self):
+        from fer import FER
+
+        self._fer = FER(mtcnn=False)
+        self.labels = self._fer._get_labels()
+
+    def find_faces(self, gray):
+        return self._fer.find_faces(gray, bgr=False)
+
+    def classify(self, faces):
+        return np.asarray(self._fer._classify_emotions(faces))
+
+
+class OnnxBackend(EmotionBackend):
+    """
+    Runs an exported (optionally int8-quantized) emotion classifier on CPU with
+    ONNX Runtime, or with OpenCV's DNN module when onnxruntime isn't installed.
+
+    Faces are found with the same Haar cascade and settings FER uses, so both
+    backends see the same crops. Models taking NCHW or NHWC input, any square
+    input size, and either [-1, 1] (``input_scale='fer'``) or 0-255
+    (``input_scale='raw'``) pixels are supported. Logits are turned into
+    probabilities with a softmax.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, model_path, labels=FER_LABELS, input_scale='fer', threads=1):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX emotion model not found: {model_path}")
+        self.labels = dict(enumerate(labels))
+        self.input_scale = input_scale
+        self._cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+        try:
+            import onnxruntime
+        except ImportError:
+            onnxruntime = None
+
+        if onnxruntime is not None:
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            self._session = onnxruntime.InferenceSession(
+                model_path, sess_options=options, providers=['CPUExecutionProvider'])
+            model_input = self._session.get_inputs()[0]
+            self._input_name = model_input.name
+            shape = model_input.shape
+            self._net = None
+            self.runtime = 'onnxruntime'
+        else:
+            cv2.setNumThreads(threads)
+            self._net = cv2.dnn.readNetFromONNX(model_path)
+            self._session = None
+            # OpenCV doesn't expose the input shape; assume the FER layout.
+            shape = [None, FACE_TARGET_SIZE[1], FACE_TARGET_SIZE[0], 1]
+            self.runtime = 'opencv-dnn'
+
+        self._channels_first = len(shape) == 4 and shape[1] == 1
+        side = shape[2] if self._channels_first else shape[1]
+        self._input_size = (side, side) if isinstance(side, int) else FACE_TARGET_SIZE
+
+    def find_faces(self, gray):
+        return self._cascade.detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=5, flags=cv2.CASCADE_SCALE_IMAGE, minSize=(50, 50))
+
+    def _prepare(self, faces):
+        if self._input_size != FACE_TARGET_SIZE:
+            faces = np.stack([cv2.resize(face, self._input_size) for face in faces])
+        if self.input_scale == 'raw':
+            faces = (faces / 2.0 + 0.5) * 255.0
+        faces = faces.astype(np.float32)
+        if self._channels_first:
+            return faces[:, np.newaxis, :, :]
+        return faces[:, :, :, np.newaxis]
+
+    def classify(self, faces):
+        batch = self._prepare(np.asarray(faces, dtype=np.float32))
+        if self._session is not None:
+            scores = self._session.run(None, {self._input_name: batch})[0]
+        else:
+            self._net.setInput(batch)
+            scores = self._net.forward()
+        scores = np.asarray(scores, dtype=np.float32).reshape(len(batch), -1)
+        if scores.min() < 0 or not np.allclose(scores.sum(axis=1), 1.0, atol=1e-2):
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+
+def load_backend(name, onnx_model=None, onnx_labels=FER_LABELS, onnx_input_scale='fer', onnx_threads=1):
+    """
+    Build the configured backend. If the ONNX backend can't be loaded, fall
+    back to FER so emotion detection keeps working.
+    """
+    if name == 'onnx':
+        try:
+            backend = OnnxBackend(onnx_model, onnx_labels, onnx_input_scale, onnx_threads)
+            logger.info("ONNX emotion backend loaded", extra={'event': 'backend_loaded', 'runtime': backend.runtime})
+            return backend
+        except Exception as e:
+            logger.error("ONNX emotion backend failed, falling back to FER",
+                         extra={'event': 'backend_failed', 'error': str(e)})
+    backend = FerBackend()
+    logger.info("FER initialized successfully", extra={'event': 'backend_loaded', 'runtime': 'fer'})
+    return backend
+
+
+def compare_backends(reference, candidate, frames, emotion_map):
+    """
+    Run both backends over the same grayscale frames and report how often
+    their dominant (mapped) emotion agrees, plus the mean absolute difference
+    of the score vectors for labels both backends share.
+    """
+    agreed = 0
+    compared = 0
+    diffs = []
+    rows = []
+    for name, gray in frames:
+        ref, _ = analyze_gray(reference, gray)
+        cand, _ = analyze_gray(candidate, gray)
+        if not ref or not cand:
+            rows.append({'image': name, 'reference': 'face' if ref else None, 'candidate': 'face' if cand else None})
+            continue
+        ref_scores = primary_face(ref)["emotions"]
+        cand_scores = primary_face(cand)["emotions"]
+        ref_label = emotion_map.get(max(ref_scores, key=ref_scores.get), "neutral")
+        cand_label = emotion_map.get(max(cand_scores, key=cand_scores.get), "neutral")
+        shared = set(ref_scores) & set(cand_scores)
+        if shared:
+            diffs.append(sum(abs(ref_scores[k] - cand_scores[k]) for k in shared) / len(shared))
+        compared += 1
+        agreed += ref_label == cand_label
+        rows.append({'image': name, 'reference': ref_label, 'candidate': cand_label})
+
+    return {
+        'compared': compared,
+        'agreement': agreed / compared if compared else None,
+        'mean_abs_diff': float(np.mean(diffs)) if diffs else None,
+        'images': rows,
+    }
@@ -0,0 +1,218 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+# These mirror the preprocessing FER applies inside detect_emotions()
+# (fer.fer.PADDING, the default offsets and the 64x64 model input), so crops
+# built here classify the same way they would through FER itself.
+FACE_PADDING = 40
+FACE_OFFSETS = (10, 10)
+FACE_TARGET_SIZE = (64, 64)
+
+
+def pad_gray(gray):
+    """Pad a grayscale frame with the mean of its bottom rows, like FER.pad."""
+    rows, cols = gray.shape[:2]
+    mean = cv2.mean(gray[rows - 2:rows, 0:cols])[0]
+    return cv2.copyMakeBorder(gray, FACE_PADDING, FACE_PADDING, FACE_PADDING, FACE_PADDING,
+                              cv2.BORDER_CONSTANT, value=[mean, mean, mean])
+
+
+def to_square(box):
+    """Grow the shorter side of an (x, y, w, h) box so it becomes square."""
+    x, y, w, h = box
+    if h > w:
+        diff = h - w
+        x -= diff // 2
+        w += diff
+    elif w > h:
+        diff = w - h
+        y -= diff // 2
+        h += diff
+    return x, y, w, h
+
+
+def extract_face_crops(gray, face_rectangles):
+    """
+    Cut the classifier input for every face box out of a grayscale frame.
+
+    Returns the boxes that produced a usable crop and a float32 array of shape
+    (n, 64, 64) already scaled to [-1, 1].
+    """
+    padded = pad_gray(gray)
+    boxes = []
+    crops = []
+    for box in face_rectangles:
+        x, y, w, h = to_square(tuple(int(v) for v in box))
+        x_off, y_off = FACE_OFFSETS
+        x1 = max(0, x - x_off + FACE_PADDING)
+        y1 = max(0, y - y_off + FACE_PADDING)
+        x2 = x + w + x_off + FACE_PADDING
+        y2 = y + h + y_off + FACE_PADDING
+        crop = padded[y1:y2, x1:x2]
+        if crop.size == 0:
+            continue
+        crops.append(cv2.resize(crop, FACE_TARGET_SIZE))
+        boxes.append([int(v) for v in box])
+
+    if not crops:
+        return boxes, np.empty((0,) + FACE_TARGET_SIZE, dtype=np.float32)
+    faces = np.asarray(crops, dtype=np.float32) / 255.0
+    faces = (faces - 0.5) * 2.0
+    return boxes, faces
+
+
+def format_results(boxes, predictions, labels):
+    """Build FER-style ``[{"box": ..., "emotions": {...}}]`` dicts from classifier rows."""
+    results = []
+    for box, scores in zip(boxes, predictions):
+        results.append({
+            "box": box,
+            "emotions": {labels[i]: round(float(score), 2) for i, score in enumerate(scores)},
+        })
+    return results
+
+
+def primary_face(results):
+    """The largest face in a frame is taken to be the person using the camera."""
+    if not results:
+        return None
+    return max(results, key=lambda face: face["box"][2] * face["box"][3])
+
+
+def map_emotion_scores(emotions, emotion_map, default="neutral"):
+    """Sum classifier label scores into the app's emotions (``emotion_map``), normalized to add up to 1."""
+    mapped = {}
+    for label, score in emotions.items():
+        emotion = emotion_map.get(label, default)
+        mapped[emotion] = mapped.get(emotion, 0.0) + float(score)
+    total = sum(mapped.values())
+    if total <= 0:
+        return {}
+    return {emotion: round(score / total, 3) for emotion, score in mapped.items()}
+
+
+def top_score(results):
+    """Highest emotion probability of the primary face, used as a confidence signal."""
+    face = primary_face(results)
+    if face is None:
+        return 0.0
+    return max(face["emotions"].values(), default=0.0)
+
+
+def analyze_gray(backend, gray, hint=None, min_confidence=0.0):
+    """
+    Detect and classify every face in a grayscale frame with an
+    emotion_backends.EmotionBackend, without batching.
+
+    When ``hint`` holds face boxes from a previous frame, only the classifier
+    runs on them; face detection is done only if that result is less
+    confident than ``min_confidence``. Returns ``(results, detected)``.
+    """
+    if hint:
+        boxes, faces = extract_face_crops(gray, hint)
+        if boxes:
+            results = format_results(boxes, backend.classify(faces), backend.labels)
+            if top_score(results) >= min_confidence:
+                return results, False
+
+    boxes, faces = extract_face_crops(gray, backend.find_faces(gray))
+    if not boxes:
+        return [], True
+    return format_results(boxes, backend.classify(faces), backend.labels), True
+
+
+class _Request:
+    __slots__ = ('faces', 'future')
+
+    def __init__(self, faces):
+        self.faces = faces
+        self.future = Future()
+
+
+class BatchInferenceEngine:
+    """
+    Collects face crops from concurrent callers and runs the emotion classifier
+    once per batch.
+
+    A batch is flushed as soon as it holds ``max_batch_size`` faces or the
+    oldest queued request has waited ``max_wait`` seconds, whichever comes
+    first. Every caller gets back only the score rows for its own faces.
+    """
+
+    def __init__(self, classify, max_batch_size=8, max_wait=0.01):
+        self.classify = classify
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches_run = 0
+        self.faces_classified = 0
+
+    def _ensure_worker(self):
+        # gunicorn forks workers after import; a thread started in the master
+        # would not exist in the children, so (re)start it per process.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='emotion-batcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, faces):
+        """Queue an (n, 64, 64) array of crops; returns a Future of the (n, labels) scores."""
+        request = _Request(faces)
+        if len(faces) == 0:
+            request.future.set_result(np.empty((0, 0), dtype=np.float32))
+            return request.future
+        self._ensure_worker()
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, faces, timeout=None):
+        return self.submit(faces).result(timeout=timeout)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            size = len(first.faces)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.faces)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        try:
+            faces = np.concatenate([request.faces for request in batch], axis=0)
+            predictions = np.asarray(self.classify(faces))
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.faces_classified += len(faces)
+        offset = 0
+        for request in batch:
+            count = len(request.faces)
+            request.future.set_result(predictions[offset:offset + count])
+            offset += count
@@ -0,0 +1,308 @@
+"""
+The emotion detection pipeline: decoding, caching, face tracking and the
+configured backend, run either in-process with micro-batching or in the
+inference process pool.
+
+Importing this module pulls in OpenCV and NumPy; app.py loads it through
+model_warmup so workers can serve other routes before it is ready.
+"""
+import logging
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import config
+import metrics
+from emotion_backends import load_backend
+from emotion_engine import (BatchInferenceEngine, extract_face_crops, format_results, map_emotion_scores,
+                            primary_face, top_score)
+from face_tracker import FaceTracker
+from frame_cache import FrameResultCache
+from frame_decode import decode_gray
+from inference_pool import InferenceBusy, InferencePool
+from structured_logging import logging_options
+
+logger = logging.getLogger(__name__)
+
+emotion_detector = None
+emotion_engine = None
+inference_pool = None
+face_tracker = None
+frame_cache = None
+
+EMOTION_BACKEND_OPTIONS = {
+    'name': config.EMOTION_BACKEND,
+    'onnx_model': config.EMOTION_ONNX_MODEL,
+    'onnx_labels': config.EMOTION_ONNX_LABELS,
+    'onnx_input_scale': config.EMOTION_ONNX_INPUT_SCALE,
+    'onnx_threads': config.EMOTION_ONNX_THREADS,
+}
+
+EMOTION_MAP = {
+    "angry": "anger",
+    "disgust": "anger",
+    "fear": "fear",
+    "happy": "happy",
+    "sad": "sad",
+    "surprise": "surprise",
+    "neutral": "neutral",
+    # FER+ style label names used by some exported ONNX models
+    "anger": "anger",
+    "contempt": "anger",
+    "happiness": "happy",
+    "sadness": "sad",
+}
+
+
+def load(start_pool=True):
+    """
+    Build the backend (or the process pool), the face tracker and the frame
+    cache. Safe to call again: already-built parts, including ones inherited
+    from a preloading gunicorn master, are kept.
+
+    ``start_pool=False`` leaves the pool's processes to start on first use,
+    which is what a gunicorn master that is about to fork wants.
+    """
+    global emotion_detector, emotion_engine, inference_pool, face_tracker, frame_cache
+
+    if face_tracker is None and config.FACE_TRACK_ENABLED:
+        face_tracker = FaceTracker(
+            redetect_every=config.FACE_TRACK_REDETECT_EVERY,
+            padding=config.FACE_TRACK_PADDING,
+            ttl=config.FACE_TRACK_TTL,
+        )
+
+    if frame_cache is None and config.FRAME_CACHE_ENABLED:
+        frame_cache = FrameResultCache(
+            max_entries=config.FRAME_CACHE_MAX_ENTRIES,
+            max_distance=config.FRAME_CACHE_MAX_DISTANCE,
+            ttl=config.FRAME_CACHE_TTL,
+        )
+
+    if config.EMOTION_EXECUTOR == 'process':
+        if inference_pool is None:
+            inference_pool = InferencePool(
+                max_workers=config.EMOTION_POOL_SIZE,
+                max_queue=config.EMOTION_POOL_MAX_QUEUE,
+                retry_after=config.EMOTION_RETRY_AFTER,
+                backend_options=EMOTION_BACKEND_OPTIONS,
+                log_options=logging_options(config),
+            )
+        if start_pool:
+            inference_pool.warm()
+    elif emotion_detector is None:
+        try:
+            emotion_detector = load_backend(**EMOTION_BACKEND_OPTIONS)
+            emotion_engine = BatchInferenceEngine(
+                emotion_detector.classify,
+                max_batch_size=config.EMOTION_BATCH_MAX_SIZE,
+                max_wait=config.EMOTION_BATCH_MAX_WAIT_MS / 1000.0,
+            )
+        except Exception as e:
+            logger.error("FER initialization failed", extra={'event': 'backend_failed', 'error': str(e)})
+            emotion_detector = None
+            emotion_engine = None
+
+
+def is_ready():
+    """True once a backend (or the pool that hosts one) is available."""
+    return inference_pool is not None or emotion_detector is not None
+
+
+def tracking_hint(track_key, gray):
+    if face_tracker is None or track_key is None or gray is None:
+        return None
+    return face_tracker.hint(track_key, gray.shape)
+
+
+def submit_frame(gray, hint=None):
+    """
+    Detect faces in the calling thread (or reuse the tracked boxes in ``hint``)
+    and hand the crops to the batching engine. Returns (boxes, future) so
+    several frames can be in flight at once.
+    """
+    face_rectangles = hint
+    if not face_rectangles:
+        with metrics.timed('detect_emotion', 'face_detect'):
+            face_rectangles = emotion_detector.find_faces(gray)
+    boxes, faces = extract_face_crops(gray, face_rectangles)
+    return boxes, emotion_engine.submit(faces)
+
+
+def collect_results(boxes, future):
+    """Turn the classifier rows for one frame into FER-style result dicts."""
+    if not boxes:
+        return []
+    with metrics.timed('detect_emotion', 'classify'):
+        predictions = future.result(timeout=config.EMOTION_INFERENCE_TIMEOUT)
+    return format_results(boxes, predictions, emotion_detector.labels)
+
+
+def pick_emotion(results):
+    if not results:
+        logger.info("No face detected", extra={'event': 'emotion_detected', 'emotion': 'neutral', 'faces': 0})
+        return "neutral"
+    best_emotion = "neutral"
+    best_score = 0.0
+
+    for face in results:
+        for emotion, score in face["emotions"].items():
+            if score > best_score:
+                best_score = score
+                best_emotion = emotion
+
+    if config.LOG_EMOTION_SCORES:
+        logger.info("Emotion scores", extra={'event': 'emotion_scores', 'results': results})
+    logger.info("Selected emotion", extra={'event': 'emotion_detected', 'emotion': best_emotion,
+                                           'score': float(best_score), 'faces': len(results)})
+
+    return EMOTION_MAP.get(best_emotion, "neutral")
+
+
+def emotion_scores(results):
+    """The primary face's scores summed into the app's emotions (see EMOTION_MAP); {} without a face."""
+    face = primary_face(results)
+    return map_emotion_scores(face["emotions"], EMOTION_MAP) if face is not None else {}
+
+
+def detect_emotion(image_data, track_key=None):
+    return detect_emotion_with_scores(image_data, track_key)[0]
+
+
+def detect_emotion_with_scores(image_data, track_key=None):
+    """(emotion, scores): the detected emotion and the score vector behind it, for blended recommendations."""
+    results = analyze_images([image_data], track_key)[0]
+    return (pick_emotion(results) if results is not None else "neutral"), emotion_scores(results)
+
+
+def detect_emotion_in_frame(gray, track_key=None):
+    return detect_emotion_in_frame_with_scores(gray, track_key)[0]
+
+
+def detect_emotion_in_frame_with_scores(gray, track_key=None):
+    results = analyze_decoded([gray], track_key)[0]
+    return (pick_emotion(results) if results is not None else "neutral"), emotion_scores(results)
+
+
+def detect_emotions_batch(images):
+    """Detect the dominant emotion for several encoded images."""
+    return [pick_emotion(results) if results is not None else "neutral"
+            for results in analyze_images(images)]
+
+
+def decode_image(image_data):
+    try:
+        gray = decode_gray(image_data)
+    except Exception as e:
+        logger.error("Frame decode error", extra={'event': 'decode_failed', 'error': str(e)})
+        gray = None
+    if gray is None:
+        logger.warning("Frame decode failed", extra={'event': 'decode_failed'})
+    return gray
+
+
+def analyze_images(images, track_key=None, use_cache=True):
+    """Decode several PNG/JPEG images and analyse them with analyze_decoded()."""
+    return analyze_decoded([decode_image(image_data) for image_data in images], track_key, use_cache)
+
+
+def analyze_decoded(frames, track_key=None, use_cache=True):
+    """
+    Run FER over several grayscale frames and return the FER-style results for
+    each one, or None where it could not be processed.
+
+    ``track_key`` identifies the caller of a single-frame request; the last
+    face box seen for that key lets consecutive frames skip face detection.
+    Repeat captures from that caller are answered from the frame cache unless
+    ``use_cache`` is False (streams, whose frames change continuously). Batch
+    and anonymous requests never use the cache.
+
+    Raises InferenceBusy when the process pool is saturated or too slow.
+    """
+    if len(frames) != 1:
+        track_key = None
+    cache = frame_cache if use_cache and track_key is not None else None
+    analyzed = [None] * len(frames)
+    todo = []
+    for i, gray in enumerate(frames):
+        if gray is None:
+            continue
+        if cache is not None:
+            with metrics.timed('detect_emotion', 'frame_cache'):
+                cached = cache.get(gray, track_key)
+            metrics.CACHE_EVENTS.labels('emotion_frames', 'miss' if cached is None else 'hit').inc()
+            if cached is not None:
+                analyzed[i] = cached
+                continue
+        todo.append(i)
+
+    if todo:
+        pending_frames = [frames[i] for i in todo]
+        if inference_pool is not None:
+            fresh = analyze_frames_in_pool(pending_frames, track_key)
+        else:
+            fresh = analyze_frames(pending_frames, track_key)
+        for i, results in zip(todo, fresh):
+            analyzed[i] = results
+            if results is not None and cache is not None:
+                cache.put(frames[i], results, track_key)
+    return analyzed
+
+
+def analyze_frames(frames, track_key=None):
+    """Classify decoded frames in this process; their face crops share classifier batches."""
+    if emotion_detector is None:
+        logger.warning("FER not initialized", extra={'event': 'backend_missing'})
+        return [None] * len(frames)
+
+    pending = []
+    for gray in frames:
+        try:
+            hint = tracking_hint(track_key, gray)
+            pending.append((gray, hint, submit_frame(gray, hint)))
+        except Exception as e:
+            logger.error("Face detection failed", extra={'event': 'inference_failed', 'error': str(e)})
+            pending.append(None)
+
+    analyzed = []
+    for item in pending:
+        if item is None:
+            analyzed.append(None)
+            continue
+        gray, hint, submitted = item
+        try:
+            results = collect_results(*submitted)
+            detected = not hint
+            if hint and top_score(results) < config.FACE_TRACK_MIN_CONFIDENCE:
+                results = collect_results(*submit_frame(gray))
+                detected = True
+            if face_tracker is not None:
+                face_tracker.update(track_key, results, detected)
+            analyzed.append(results)
+        except Exception as e:
+            logger.error("Emotion classification failed", extra={'event': 'inference_failed', 'error': str(e)})
+            analyzed.append(None)
+    return analyzed
+
+
+def analyze_frames_in_pool(frames, track_key=None):
+    hints = [tracking_hint(track_key, gray) for gray in frames]
+    future = inference_pool.submit(frames, hints, config.FACE_TRACK_MIN_CONFIDENCE)
+    try:
+        with metrics.timed('detect_emotion', 'pool'):
+            analyzed = future.result(timeout=config.EMOTION_INFERENCE_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise InferenceBusy("Emotion detection timed out", inference_pool.retry_after)
+    except Exception as e:
+        logger.error("Inference pool failed", extra={'event': 'inference_failed', 'error': str(e)})
+        return [None] * len(frames)
+
+    results = []
+    for item in analyzed:
+        if item is None:
+            results.append(None)
+            continue
+        frame_results, detected = item
+        if face_tracker is not None:
+            face_tracker.update(track_key, frame_results, detected)
+        results.append(frame_results)
+    return results
@@ -0,0 +1,89 @@
+import json
+import time
+
+from emotion_engine import map_emotion_scores, primary_face
+from inference_pool import InferenceBusy
+
+
+class EmotionSmoother:
+    """
+    Exponential moving average over FER emotion score vectors, so the
+    reported argmax doesn't flicker between consecutive frames.
+    """
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.scores = None
+
+    def update(self, emotions):
+        if self.scores is None:
+            self.scores = dict(emotions)
+        else:
+            for label, score in emotions.items():
+                previous = self.scores.get(label, score)
+                self.scores[label] = previous + self.alpha * (score - previous)
+        return self.scores
+
+    def best(self):
+        if not self.scores:
+            return None, 0.0
+        label = max(self.scores, key=self.scores.get)
+        return label, self.scores[label]
+
+
+def run_emotion_stream(ws, analyze, emotion_map, target_fps=5, alpha=0.3, idle_timeout=30):
+    """
+    Serve one live emotion stream over a websocket.
+
+    The client sends encoded frames as binary messages as fast as it likes.
+    Frames are analysed at no more than ``target_fps``; anything that arrives
+    while a newer frame is already waiting is dropped, so a slow server always
+    works on the most recent image. After every analysed frame a JSON update
+    with the smoothed scores is sent back.
+    """
+    interval = 1.0 / max(target_fps, 0.1)
+    smoother = EmotionSmoother(alpha)
+    latest = None
+    dropped = 0
+    next_due = 0.0
+
+    while True:
+        if latest is None:
+            wait = idle_timeout
+        else:
+            wait = max(0.0, next_due - time.monotonic())
+        message = ws.receive(timeout=wait)
+        if message is None and latest is None:
+            break  # client went quiet
+        while message is not None:
+            if isinstance(message, (bytes, bytearray)):
+                if latest is not None:
+                    dropped += 1
+                latest = bytes(message)
+            message = ws.receive(timeout=0)
+
+        if latest is None or time.monotonic() < next_due:
+            continue
+
+        frame, latest = latest, None
+        started = time.monotonic()
+        next_due = started + interval
+        try:
+            results = analyze(frame)
+        except InferenceBusy:
+            dropped += 1
+            continue
+
+        face = primary_face(results)
+        if face is not None:
+            smoother.update(face["emotions"])
+        label, score = smoother.best()
+        ws.send(json.dumps({
+            'face': face is not None,
+            'emotion': emotion_map.get(label, "neutral") if label else None,
+            'score': round(score, 3),
+            'scores': {k: round(v, 3) for k, v in (smoother.scores or {}).items()},
+            'emotion_scores': map_emotion_scores(smoother.scores or {}, emotion_map),
+            'dropped': dropped,
+            'latency_ms': round((time.monotonic() - started) * 1000, 1),
+        }))
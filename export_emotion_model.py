@@ -0,0 +1,50 @@
+"""
+Export FER's bundled Keras emotion model to ONNX for EMOTION_BACKEND=onnx,
+optionally quantizing the weights to int8.
+
+    pip install fer tf2onnx onnxruntime
+    python export_emotion_model.py --output models/emotion_model.onnx --int8
+
+With --int8 the quantized copy is written next to the output file with an
+``_int8`` suffix (models/emotion_model_int8.onnx, the default
+EMOTION_ONNX_MODEL). The exported model keeps FER's label order and [-1, 1]
+input scaling, so the default EMOTION_ONNX_LABELS / EMOTION_ONNX_INPUT_SCALE
+apply. Check it against FER with ``flask check-backend-parity <images>``.
+"""
+import argparse
+import os
+
+
+def export(output, int8):
+    import pkg_resources
+    import tensorflow as tf
+    import tf2onnx
+
+    try:
+        from tensorflow.keras.models import load_model
+    except ImportError:
+        from keras.models import load_model
+
+    model = load_model(pkg_resources.resource_filename("fer", "data/emotion_model.hdf5"), compile=False)
+    height, width = model.input_shape[1:3]
+    signature = [tf.TensorSpec((None, height, width, 1), tf.float32, name="faces")]
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=13, output_path=output)
+    print(f"✅ Exported {output}")
+
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        root, ext = os.path.splitext(output)
+        quantized = f"{root}_int8{ext}"
+        quantize_dynamic(output, quantized, weight_type=QuantType.QInt8)
+        print(f"✅ Quantized {quantized}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="models/emotion_model.onnx")
+    parser.add_argument("--int8", action="store_true", help="also write a dynamically quantized int8 copy")
+    args = parser.parse_args()
+    export(args.output, args.int8)
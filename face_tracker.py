@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+from emotion_engine import primary_face
+
+
+class _Track:
+    __slots__ = ('box', 'frames_since_detect', 'updated_at')
+
+    def __init__(self, box):
+        self.box = box
+        self.frames_since_detect = 0
+        self.updated_at = time.monotonic()
+
+
+class FaceTracker:
+    """
+    Remembers the last detected face box per session so consecutive frames
+    from the same caller can skip face detection.
+
+    A session gets a hint (the padded previous box) until ``redetect_every``
+    frames have been classified without detection, the track is older than
+    ``ttl`` seconds, or a tracked frame came back less confident than the
+    caller's threshold (the caller then detects and reports detected=True).
+    """
+
+    def __init__(self, redetect_every=10, padding=0.15, ttl=10.0, max_sessions=1024):
+        self.redetect_every = max(1, int(redetect_every))
+        self.padding = padding
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._tracks = OrderedDict()
+        self._lock = threading.Lock()
+        self.tracked_frames = 0
+        self.detected_frames = 0
+
+    def hint(self, key, frame_shape):
+        """Face boxes to classify directly for this session's next frame, or None."""
+        if key is None:
+            return None
+        with self._lock:
+            track = self._tracks.get(key)
+            if track is None:
+                return None
+            if (track.frames_since_detect >= self.redetect_every
+                    or time.monotonic() - track.updated_at > self.ttl):
+                del self._tracks[key]
+                return None
+            self._tracks.move_to_end(key)
+            box = track.box
+
+        x, y, w, h = box
+        pad_x = int(w * self.padding)
+        pad_y = int(h * self.padding)
+        height, width = frame_shape[:2]
+        x1 = max(0, x - pad_x)
+        y1 = max(0, y - pad_y)
+        x2 = min(width, x + w + pad_x)
+        y2 = min(height, y + h + pad_y)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return [[x1, y1, x2 - x1, y2 - y1]]
+
+    def update(self, key, results, detected):
+        """Record the outcome for a session's frame; ``detected`` means face detection ran."""
+        if key is None:
+            return
+        if detected:
+            self.detected_frames += 1
+        else:
+            self.tracked_frames += 1
+
+        face = primary_face(results)
+        with self._lock:
+            if face is None:
+                self._tracks.pop(key, None)
+                return
+            track = self._tracks.get(key)
+            if detected or track is None:
+                # Tracked results report the padded box; only keep boxes that came from detection.
+                if not detected:
+                    return
+                track = _Track(list(face["box"]))
+                self._tracks[key] = track
+            else:
+                track.frames_since_detect += 1
+                track.updated_at = time.monotonic()
+            self._tracks.move_to_end(key)
+            while len(self._tracks) > self.max_sessions:
+                self._tracks.popitem(last=False)
+
+    def forget(self, key):
+        with self._lock:
+            self._tracks.pop(key, None)
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from emotion_engine import primary_face
+
+
+def dhash(gray, hash_size=16):
+    """
+    Difference hash of a grayscale image: shrink to (hash_size + 1) x hash_size
+    and record whether each pixel is brighter than its right neighbour.
+    Near-identical images end up a few bits apart.
+    """
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).tobytes().hex(), 16)
+
+
+def face_hash(gray, box, hash_size=16):
+    """dHash of the ``box`` ([x, y, w, h]) region of a frame, or None when it falls outside."""
+    x, y, w, h = (int(v) for v in box)
+    crop = gray[max(0, y):y + h, max(0, x):x + w]
+    if crop.shape[0] < 2 or crop.shape[1] < 2:
+        return None
+    return dhash(crop, hash_size)
+
+
+class FrameResultCache:
+    """
+    Bounded LRU of detection results for one caller's recent frames.
+
+    An entry remembers the primary face box of the frame it was made for and
+    the dHash of that face crop. A new frame from the same scope hits when
+    its crop at the stored box hashes within ``max_distance`` bits and the
+    entry is younger than ``ttl`` seconds; the whole frame is never compared,
+    since a changed expression barely moves a whole-frame hash. Hits don't
+    extend an entry's life. Lookups without a scope never hit: callers must
+    not share results. The cache is small by design, so a linear scan over the
+    entries is cheaper than an index.
+    """
+
+    def __init__(self, max_entries=256, max_distance=2, ttl=5.0, hash_size=16):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.hash_size = hash_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, gray, scope):
+        if scope is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            candidates = []
+            for key, (stored_at, results) in list(self._entries.items()):
+                if now - stored_at > self.ttl:
+                    del self._entries[key]
+                    self.expired += 1
+                elif key[0] == scope:
+                    candidates.append(key)
+        # Hash outside the lock; a caller has only a handful of live entries.
+        match = None
+        hashes = {}
+        for key in candidates:
+            box = key[1]
+            if box not in hashes:
+                hashes[box] = face_hash(gray, box, self.hash_size)
+            if hashes[box] is not None and (key[2] ^ hashes[box]).bit_count() <= self.max_distance:
+                match = key
+                break
+        with self._lock:
+            entry = self._entries.get(match) if match is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(match)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, gray, results, scope):
+        """Remember ``results`` for the frame ``gray``; frames without a face aren't cached."""
+        face = primary_face(results)
+        if scope is None or face is None:
+            return
+        box = tuple(int(v) for v in face["box"])
+        frame_hash = face_hash(gray, box, self.hash_size)
+        if frame_hash is None:
+            return
+        with self._lock:
+            key = (scope, box, frame_hash)
+            self._entries[key] = (time.monotonic(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'max_distance': self.max_distance,
+                'ttl': self.ttl,
+            }
@@ -0,0 +1,97 @@
+import struct
+
+import cv2
+import numpy as np
+
+import metrics
+
+# Frames are analysed at no more than this size; larger uploads are scaled
+# down (keeping their aspect ratio) before face detection.
+MAX_FRAME_SIZE = (640, 480)
+
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+def image_size(data):
+    """Read (width, height) from a PNG or JPEG header without decoding it, or None."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        width, height = struct.unpack('>II', data[16:24])
+        return width, height
+    if data[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        # SOF0..SOF15 carry the frame size, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def fit_within(gray, max_size=MAX_FRAME_SIZE):
+    """Scale a frame down to fit ``max_size`` without changing its aspect ratio."""
+    height, width = gray.shape[:2]
+    scale = min(max_size[0] / width, max_size[1] / height)
+    if scale >= 1.0:
+        return gray
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def decode_gray(image_data, max_size=MAX_FRAME_SIZE):
+    """
+    Decode a PNG/JPEG straight to grayscale, letting libjpeg drop resolution
+    during decoding (IMREAD_REDUCED_*) as long as the result is still at least
+    the final size, then resize once to fit ``max_size``. Returns None if it
+    can't be decoded.
+    """
+    flag = cv2.IMREAD_GRAYSCALE
+    size = image_size(image_data)
+    if size and size[0] > 0 and size[1] > 0:
+        scale = min(max_size[0] / size[0], max_size[1] / size[1])
+        target = (round(size[0] * scale), round(size[1] * scale))
+        for factor, reduced_flag in _REDUCED_FLAGS:
+            if size[0] // factor >= target[0] and size[1] // factor >= target[1]:
+                flag = reduced_flag
+                break
+    with metrics.timed('detect_emotion', 'imdecode'):
+        gray = cv2.imdecode(np.frombuffer(image_data, np.uint8), flag)
+    if gray is None:
+        return None
+    with metrics.timed('detect_emotion', 'resize'):
+        return fit_within(gray, max_size)
+
+
+def wrap_raw(buffer, width, height, channels=1, max_size=MAX_FRAME_SIZE):
+    """
+    View an uncompressed 8-bit buffer (grayscale, or RGB when ``channels`` is 3)
+    as a grayscale frame. Grayscale input is wrapped without decoding or copying.
+
+    Raises ValueError when the dimensions don't match the buffer.
+    """
+    if channels not in (1, 3):
+        raise ValueError("channels must be 1 (grayscale) or 3 (RGB)")
+    if width <= 0 or height <= 0 or width > 2 * max_size[0] or height > 2 * max_size[1]:
+        raise ValueError(f"Raw frames must be at most {2 * max_size[0]}x{2 * max_size[1]}")
+    if len(buffer) != width * height * channels:
+        raise ValueError("Raw buffer size does not match width x height x channels")
+
+    pixels = np.frombuffer(buffer, np.uint8)
+    if channels == 1:
+        gray = pixels.reshape(height, width)
+    else:
+        gray = cv2.cvtColor(pixels.reshape(height, width, 3), cv2.COLOR_RGB2GRAY)
+    return fit_within(gray, max_size)
@@ -0,0 +1,58 @@
+import os
+import shutil
+import sys
+import tempfile
+
+# Threads share one copy of the emotion model per worker process.
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# With EMOTION_WARMUP=preload the master imports the app (and loads the model)
+# once before forking, so workers start warm and share its memory.
+preload_app = os.getenv("EMOTION_WARMUP", "background").lower() == "preload"
+
+# Every worker writes its Prometheus samples here and /metrics adds them up.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "emotionpix-metrics"))
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def on_starting(server):
+    # Samples left by a previous run would otherwise be added to this one's.
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+    # Fingerprinted static files are built once, before any worker serves a page.
+    import config
+
+    if config.ASSET_BUILD_ON_START:
+        from assets import build_assets
+
+        root = os.path.dirname(os.path.abspath(__file__))
+        try:
+            build_assets(os.path.join(root, "static"), os.path.join(root, config.ASSET_OUTPUT_DIR),
+                         webp_quality=config.ASSET_WEBP_QUALITY)
+        except OSError:
+            server.log.exception("Building static assets failed; serving unfingerprinted files")
+
+
+def post_fork(server, worker):
+    app_module = sys.modules.get("app") if preload_app else None
+    if app_module is None:
+        return
+    # Threads don't survive the fork: the preloaded app left its periodic
+    # jobs to each worker.
+    app_module.start_periodic_jobs()
+
+    # With EMOTION_EXECUTOR=process the preloaded master only built the pool;
+    # each worker starts its own processes before taking requests.
+    service = app_module.model_warmup.value
+    if service is not None and service.inference_pool is not None:
+        service.inference_pool.warm()
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
@@ -0,0 +1,134 @@
+import base64
+import binascii
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+
+class JsonPayload:
+    """A JSON-able value, its serialized body and the strong ETag derived from those bytes."""
+
+    __slots__ = ('data', 'body', 'etag')
+
+    def __init__(self, data):
+        self.data = data
+        self.body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+
+
+def payload_response(payload, cache_control):
+    """
+    Serve ``payload`` with its ETag and ``cache_control``; answer 304 with no
+    body when the client's If-None-Match already has it.
+    """
+    if request.if_none_match.contains(payload.etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+class PayloadMemo:
+    """
+    Keeps one JsonPayload per key, built from a source object (e.g. a cached
+    movie list) and rebuilt only when a different source object turns up.
+    Holding the source keeps the identity check safe from id() reuse. With
+    ``max_entries``, the least recently used keys are dropped beyond that.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, key, source, build):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is source:
+                self._entries.move_to_end(key)
+                return entry[1]
+        payload = JsonPayload(build(source))
+        with self._lock:
+            self._entries[key] = (source, payload)
+            self._entries.move_to_end(key)
+            self.builds += 1
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return payload
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(str(offset).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """The offset behind a cursor from encode_cursor(); raises ValueError for anything else."""
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+def page_args(default_limit, max_limit):
+    """
+    (offset, limit) from the ``cursor`` and ``limit`` query arguments. The
+    limit is None when neither is given, meaning the whole list. Raises
+    ValueError for a bad cursor or limit.
+    """
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit')
+    if cursor is None and limit is None:
+        return 0, None
+    offset = decode_cursor(cursor) if cursor else 0
+    limit = int(limit) if limit else default_limit
+    if limit <= 0:
+        raise ValueError("limit must be positive")
+    return offset, min(limit, max_limit)
+
+
+def wants_ndjson():
+    return (request.args.get('format') == 'ndjson'
+            or request.accept_mimetypes.best == 'application/x-ndjson')
+
+
+def list_response(payload, key, offset, limit, cache_control):
+    """
+    Serve one page of the list at ``payload.data[key]``. The response is a
+    JSON object with ``next_cursor``, or NDJSON (one item per line and a
+    final ``{"next_cursor": ...}`` line, written as it is produced) when the
+    client asks for it. Without a limit, the whole payload is served as is.
+    """
+    ndjson = wants_ndjson()
+    if limit is None and not ndjson:
+        response = payload_response(payload, cache_control)
+        response.vary.add('Accept')
+        return response
+
+    items = payload.data[key]
+    end = len(items) if limit is None else offset + limit
+    page = items[offset:end]
+    next_cursor = encode_cursor(end) if end < len(items) else None
+    if not ndjson:
+        response = payload_response(JsonPayload({key: page, 'next_cursor': next_cursor}), cache_control)
+        response.vary.add('Accept')
+        return response
+
+    def lines():
+        for item in page:
+            yield json.dumps(item, separators=(',', ':')) + '\n'
+        yield json.dumps({'next_cursor': next_cursor}) + '\n'
+
+    response = Response(lines(), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,125 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from emotion_backends import load_backend
+from emotion_engine import analyze_gray
+from structured_logging import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Set in each pool process by _init_worker(); never used in the web worker.
+_detector = None
+
+
+def _init_worker(backend_options, log_options=None):
+    global _detector
+    if log_options is not None:
+        configure_logging(**log_options)
+    try:
+        _detector = load_backend(**backend_options)
+        logger.info("Emotion backend ready in inference process",
+                    extra={'event': 'pool_process_ready', 'backend': _detector.name})
+    except Exception as e:
+        logger.error("FER initialization failed", extra={'event': 'backend_failed', 'error': str(e)})
+        _detector = None
+
+
+def _ping():
+    return os.getpid()
+
+
+def _analyze_frames(frames, hints, min_confidence):
+    if _detector is None:
+        return [None] * len(frames)
+    return [analyze_gray(_detector, gray, hint, min_confidence) if gray is not None else None
+            for gray, hint in zip(frames, hints)]
+
+
+class InferenceBusy(Exception):
+    """Raised when the pool cannot take more work; callers should answer 503."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InferencePool:
+    """
+    A pool of pre-warmed processes, each holding one emotion backend (see
+    emotion_backends.load_backend), that runs face detection and
+    classification away from the Flask worker.
+
+    At most ``max_workers + max_queue`` requests may be outstanding; past that
+    submit() raises InferenceBusy immediately instead of queueing more work.
+    """
+
+    def __init__(self, max_workers=2, max_queue=8, retry_after=1, backend_options=None, log_options=None):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.retry_after = retry_after
+        self.backend_options = backend_options or {'name': 'fer'}
+        self.log_options = log_options
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_executor(self):
+        # Pools cannot be shared across a fork, so every gunicorn worker gets its own.
+        if self._executor is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                return
+            # spawn rather than fork: the parent may already hold threads and TensorFlow state.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.backend_options, self.log_options),
+            )
+            self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+            self._pid = os.getpid()
+
+    def warm(self):
+        """Start every process now so the model is loaded before the first request."""
+        if multiprocessing.current_process().name != 'MainProcess':
+            # spawn re-imports the main module in each child; don't start pools from there.
+            return
+        self._ensure_executor()
+        for _ in range(self.max_workers):
+            self._executor.submit(_ping)
+        logger.info("FER inference pool started", extra={'event': 'pool_started', 'processes': self.max_workers})
+
+    def submit(self, frames, hints=None, min_confidence=0.0):
+        """
+        Queue decoded grayscale frames, optionally with tracked face boxes per
+        frame. Returns a Future of per-frame ``(results, detected)`` pairs.
+        """
+        if hints is None:
+            hints = [None] * len(frames)
+        self._ensure_executor()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise InferenceBusy("Emotion detection queue is full", self.retry_after)
+        try:
+            future = self._executor.submit(_analyze_frames, frames, hints, min_confidence)
+        except BrokenProcessPool:
+            slots.release()
+            # A crashed child poisons the whole executor; build a fresh one next time.
+            self._executor = None
+            raise InferenceBusy("Emotion detection pool is restarting", self.retry_after)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
@@ -0,0 +1,119 @@
+"""
+Prometheus metrics for the hot paths: per-stage latency histograms, cache
+events, upstream (RapidAPI, Supabase auth) latency and errors, and in-flight
+gauges.
+
+With PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py sets it) every worker
+writes its samples to files in that directory and ``render()`` adds them up,
+so a scrape sees the whole server rather than whichever worker answered it.
+Without prometheus_client installed every metric is a no-op.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:
+    logging.getLogger(__name__).warning("prometheus_client not installed. /metrics will be empty.")
+    prometheus_client = None
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NoOpMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+
+if prometheus_client is not None:
+    REQUEST_SECONDS = Histogram(
+        'emotionpix_request_seconds', 'Time to handle a request, by endpoint',
+        ['endpoint'], buckets=LATENCY_BUCKETS)
+    REQUESTS_IN_FLIGHT = Gauge(
+        'emotionpix_requests_in_flight', 'Requests being handled, by endpoint',
+        ['endpoint'], multiprocess_mode='livesum')
+    STAGE_SECONDS = Histogram(
+        'emotionpix_stage_seconds', 'Time spent in each stage of a hot path',
+        ['path', 'stage'], buckets=LATENCY_BUCKETS)
+    CACHE_EVENTS = Counter(
+        'emotionpix_cache_events_total', 'Cache lookups by outcome (hit, miss, stale, ...)',
+        ['cache', 'event'])
+    UPSTREAM_SECONDS = Histogram(
+        'emotionpix_upstream_seconds', 'Latency of calls to upstream services',
+        ['service'], buckets=LATENCY_BUCKETS)
+    UPSTREAM_ERRORS = Counter(
+        'emotionpix_upstream_errors_total', 'Failed upstream calls by reason',
+        ['service', 'reason'])
+    UPSTREAM_IN_FLIGHT = Gauge(
+        'emotionpix_upstream_in_flight', 'Upstream calls in progress',
+        ['service'], multiprocess_mode='livesum')
+else:
+    REQUEST_SECONDS = REQUESTS_IN_FLIGHT = STAGE_SECONDS = CACHE_EVENTS = _NoOpMetric()
+    UPSTREAM_SECONDS = UPSTREAM_ERRORS = UPSTREAM_IN_FLIGHT = _NoOpMetric()
+
+
+@contextmanager
+def timed(path, stage):
+    """Record how long the block takes as ``stage`` of ``path``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(path, stage).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def upstream_call(service):
+    """Time a call to ``service`` and count it as in flight while it runs."""
+    gauge = UPSTREAM_IN_FLIGHT.labels(service)
+    gauge.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        UPSTREAM_SECONDS.labels(service).observe(time.perf_counter() - start)
+        gauge.dec()
+
+
+def upstream_error(service, reason):
+    UPSTREAM_ERRORS.labels(service, reason).inc()
+
+
+def cache_observer(cache):
+    """An ``on_event`` callback for tiered_cache.TieredCache that counts its events."""
+    def observe(event):
+        CACHE_EVENTS.labels(cache, event).inc()
+    return observe
+
+
+def render():
+    """The exposition body and its content type."""
+    if prometheus_client is None:
+        return b'', 'text/plain; version=0.0.4; charset=utf-8'
+    registry = prometheus_client.REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges (gunicorn's child_exit hook)."""
+    if prometheus_client is not None and os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,87 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWarmup:
+    """
+    Loads something expensive (the emotion detection stack) once per process,
+    either in a background thread or on demand, and lets request handlers
+    wait a bounded time for it.
+
+    The state is tied to the process that started loading: a gunicorn worker
+    forked while its master was still loading starts its own load, while one
+    forked after the master finished simply inherits the loaded value.
+    """
+
+    def __init__(self, load, retry_after_failure=30.0):
+        self._load = load
+        self.retry_after_failure = retry_after_failure
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._failed_at = None
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+
+    def _loading_here(self):
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def start(self):
+        """Begin loading in a background thread unless it is loaded or loading already."""
+        with self._lock:
+            if self.value is not None or self._loading_here():
+                return
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_after_failure:
+                return
+            self._pid = os.getpid()
+            self._ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='model-warmup', daemon=True)
+            self._thread.start()
+
+    def load_now(self, *args, **kwargs):
+        """Load synchronously in the calling thread, e.g. in a preloading gunicorn master."""
+        with self._lock:
+            if self.value is None:
+                self._pid = os.getpid()
+                self._ready = threading.Event()
+                self._run(*args, **kwargs)
+        return self.value
+
+    def _run(self, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            self.value = self._load(*args, **kwargs)
+            self.error = None
+            self._failed_at = None
+        except Exception as e:
+            logger.error("Model warm-up failed", extra={'event': 'warmup_failed', 'error': str(e)})
+            self.error = str(e)
+            self._failed_at = time.monotonic()
+        finally:
+            self.load_seconds = round(time.monotonic() - started, 3)
+            self._ready.set()
+
+    def get(self, timeout=0):
+        """The loaded value, waiting up to ``timeout`` seconds for it; None if not ready."""
+        if self.value is not None:
+            return self.value
+        self.start()
+        self._ready.wait(timeout)
+        return self.value
+
+    def status(self):
+        if self.value is not None:
+            state = 'loaded'
+        elif self._loading_here():
+            state = 'loading'
+        elif self.error:
+            state = 'failed'
+        else:
+            state = 'idle'
+        return {'state': state, 'error': self.error, 'load_seconds': self.load_seconds}
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SEARCH_URL = "https://imdb236.p.rapidapi.com/api/imdb/search"
+
+
+class MovieApiUnavailable(requests.exceptions.RequestException):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+def _is_upstream_failure(status_code):
+    """Timeouts, connection errors (no status), 5xx and rate limiting count against the breaker; other 4xx don't."""
+    return status_code is None or status_code >= 500 or status_code == 429
+
+
+def _failure_reason(status_code, error):
+    """A low-cardinality label for a failed call (requests or httpx)."""
+    if status_code == 429:
+        return 'rate_limited'
+    if status_code is not None:
+        return f'http_{status_code // 100}xx'
+    name = type(error).__name__
+    if 'Timeout' in name:
+        return 'timeout'
+    if 'Connect' in name:
+        return 'connection'
+    return 'error'
+
+
+class MovieApiClient:
+    """
+    Client for the imdb236 RapidAPI search endpoint.
+
+    ``search`` reuses keep-alive connections from a pooled requests.Session
+    (one per process, so forked workers don't share sockets) and applies
+    separate connect and read timeouts. ``search_many`` runs several searches
+    at once on an httpx.AsyncClient, or on a thread pool over the shared
+    session when httpx isn't installed.
+
+    With a ``breaker`` (circuit_breaker.CircuitBreaker) upstream failures are
+    counted, and while the circuit is open calls fail immediately.
+
+    Raises requests.RequestException (from ``search``) when a call fails,
+    MovieApiUnavailable when the circuit is open.
+    """
+
+    def __init__(self, api_key, host, url=SEARCH_URL, connect_timeout=3.05, read_timeout=5.0,
+                 pool_size=10, max_concurrency=4, breaker=None):
+        self.url = url
+        self.breaker = breaker
+        self.headers = {
+            "x-rapidapi-key": api_key or "",
+            "x-rapidapi-host": host or "",
+        }
+        self.configured = bool(api_key and host)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(self.headers)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def _allow(self):
+        return self.breaker is None or self.breaker.allow()
+
+    def _record(self, status_code=None, failed=False):
+        if self.breaker is None:
+            return
+        if failed and _is_upstream_failure(status_code):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def search(self, params):
+        if not self._allow():
+            metrics.upstream_error('rapidapi', 'circuit_open')
+            raise MovieApiUnavailable("Movie API circuit is open")
+        try:
+            with metrics.upstream_call('rapidapi'):
+                response = self._get_session().get(
+                    self.url, params=params, timeout=(self.connect_timeout, self.read_timeout))
+            logger.info("RapidAPI response", extra={'event': 'rapidapi_response', 'status': response.status_code})
+            response.raise_for_status()
+            body = response.json()
+        except requests.exceptions.RequestException as e:
+            response = getattr(e, 'response', None)
+            status_code = response.status_code if response is not None else None
+            metrics.upstream_error('rapidapi', _failure_reason(status_code, e))
+            self._record(status_code, failed=True)
+            raise
+        self._record()
+        return body
+
+    def search_many(self, params_list):
+        """Run several searches concurrently; returns their JSON bodies in order, None where one failed."""
+        if not params_list:
+            return []
+        try:
+            import httpx
+        except ImportError:
+            httpx = None
+        if httpx is None:
+            return self._search_many_threaded(params_list)
+        return asyncio.run(self._search_many_async(httpx, params_list))
+
+    def _search_or_none(self, params):
+        try:
+            return self.search(params)
+        except requests.exceptions.RequestException as e:
+            logger.error("Error fetching movies", extra={'event': 'rapidapi_failed', 'error': str(e)})
+            return None
+
+    def _search_many_threaded(self, params_list):
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(params_list))) as executor:
+            return list(executor.map(self._search_or_none, params_list))
+
+    async def _search_many_async(self, httpx, params_list):
+        timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        async with httpx.AsyncClient(headers=self.headers, timeout=timeout, limits=limits) as client:
+            async def fetch(params):
+                if not self._allow():
+                    metrics.upstream_error('rapidapi', 'circuit_open')
+                    return None
+                response = None
+                try:
+                    with metrics.upstream_call('rapidapi'):
+                        response = await client.get(self.url, params=params)
+                    logger.info("RapidAPI response",
+                                extra={'event': 'rapidapi_response', 'status': response.status_code})
+                    response.raise_for_status()
+                    body = response.json()
+                except (httpx.HTTPError, ValueError) as e:
+                    logger.error("Error fetching movies", extra={'event': 'rapidapi_failed', 'error': str(e)})
+                    status_code = response.status_code if response is not None else None
+                    metrics.upstream_error('rapidapi', _failure_reason(status_code, e))
+                    self._record(status_code, failed=True)
+                    return None
+                self._record()
+                return body
+
+            return await asyncio.gather(*(fetch(params) for params in params_list))
@@ -0,0 +1,80 @@
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Spaces out calls so no more than ``rate`` happen per second on average."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, calls=1):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + calls * self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class PeriodicJob:
+    """
+    Runs ``job()`` every ``interval`` seconds, give or take ``jitter`` (a
+    fraction of the interval) so workers started together drift apart, in a
+    daemon thread. ``claim()``, if given, is asked before each pass and lets
+    just one of several workers do it.
+    """
+
+    def __init__(self, job, interval=300.0, jitter=0.1, claim=None, name='periodic-job'):
+        self.job = job
+        self.name = name
+        self.interval = interval
+        self.jitter = jitter
+        self.claim = claim
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.passes = 0
+        self.last_result = None
+        self.last_error = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _delay(self):
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _run(self):
+        # The first pass also waits a little, so a fresh deploy doesn't run
+        # it from every worker at the same moment.
+        time.sleep(random.uniform(0, self.interval * self.jitter))
+        while True:
+            try:
+                if self.claim is None or self.claim():
+                    self.last_result = self.job()
+                    self.last_error = None
+                    self.passes += 1
+            except Exception as e:
+                logger.error("Periodic job failed", extra={'event': 'job_failed', 'job': self.name, 'error': str(e)})
+                self.last_error = str(e)
+            time.sleep(self._delay())
+
+    def status(self):
+        return {
+            'running': self._thread is not None and self._pid == os.getpid() and self._thread.is_alive(),
+            'passes': self.passes,
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+        }
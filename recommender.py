@@ -0,0 +1,190 @@
+"""
+Blended recommendations: rank every cached movie against a whole emotion
+score vector instead of serving one genre list.
+
+The cached genre lists are turned into a ranking index once, whenever one of
+them changes: each distinct movie becomes a row of a float32 feature matrix
+with a one-hot column per genre, plus the rating, vote count and release
+year scaled to [0, 1]. A request then costs one matrix-vector product with
+the weights its scores give each genre and a top-k ``argpartition``.
+"""
+import math
+import threading
+
+import numpy as np
+
+import metrics
+
+
+def parse_scores(spec, emotions):
+    """
+    ``"happy:0.6,sad:0.3"`` -> {"happy": 0.6, "sad": 0.3}, normalized to sum
+    to 1. Labels not in ``emotions`` are ignored; None when nothing usable is
+    left. Raises ValueError for a malformed spec.
+    """
+    scores = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        label, sep, value = item.partition(':')
+        if not sep:
+            raise ValueError(f"Expected emotion:score, got {item!r}")
+        score = float(value)
+        if not math.isfinite(score) or score < 0:
+            raise ValueError(f"Invalid score for {label.strip()!r}")
+        label = label.strip()
+        if label in emotions:
+            scores[label] = scores.get(label, 0.0) + score
+    total = sum(scores.values())
+    if total <= 0:
+        return None
+    return {label: score / total for label, score in scores.items()}
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _scaled(values):
+    """Min-max scale a column to [0, 1]; missing values (NaN) become 0."""
+    present = ~np.isnan(values)
+    if not present.any():
+        return np.zeros_like(values)
+    low, high = values[present].min(), values[present].max()
+    scaled = (values - low) / (high - low) if high > low else np.ones_like(values)
+    scaled[~present] = 0.0
+    return scaled
+
+
+class RankingIndex:
+    """
+    The movies of several genre lists, deduplicated, with their features.
+
+    ``features`` is an (n, len(genres) + 3) float32 matrix: one-hot genre
+    columns, then rating, log vote count and year. ``quality`` is the fixed
+    rating/votes/year part of every movie's score, worked out at build time
+    since its weights come from config.
+    """
+
+    def __init__(self, genres, lists, shape, quality_weights):
+        self.genres = tuple(genres)
+        column = {genre: i for i, genre in enumerate(self.genres)}
+        rows = {}
+        movies = []
+        raw = []
+        for genre, movie_list in lists.items():
+            for movie in movie_list or ():
+                if not isinstance(movie, dict):
+                    continue
+                key = movie.get('id') or movie.get('primaryTitle')
+                if key is None:
+                    continue
+                row = rows.get(key)
+                if row is None:
+                    shaped = shape(movie)
+                    if shaped is None:
+                        continue
+                    row = rows[key] = len(movies)
+                    movies.append(shaped)
+                    votes = _number(movie.get('numVotes'))
+                    raw.append((set(movie.get('genres') or ()),
+                                _number(movie.get('averageRating')),
+                                math.log1p(votes) if votes is not None and votes >= 0 else None,
+                                _number(movie.get('startYear'))))
+                # The list a movie came from counts as one of its genres even
+                # when its own ``genres`` field leaves it out.
+                raw[row][0].add(genre)
+
+        self.movies = movies
+        features = np.zeros((len(movies), len(self.genres) + 3), dtype=np.float32)
+        numeric = np.full((len(movies), 3), np.nan, dtype=np.float64)
+        for i, (movie_genres, rating, votes, year) in enumerate(raw):
+            for genre in movie_genres:
+                if genre in column:
+                    features[i, column[genre]] = 1.0
+            numeric[i] = [np.nan if v is None else v for v in (rating, votes, year)]
+        for j in range(3):
+            features[:, len(self.genres) + j] = _scaled(numeric[:, j])
+        self.features = features
+        self.genre_features = features[:, :len(self.genres)]
+        self.quality = features[:, len(self.genres):] @ np.asarray(quality_weights, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.movies)
+
+    def rank(self, genre_weights, k):
+        """
+        Up to ``k`` shaped movies, best first, for a {genre: weight} mapping.
+        Movies in none of the weighted genres are left out.
+        """
+        if not self.movies or k <= 0:
+            return []
+        weights = np.array([genre_weights.get(genre, 0.0) for genre in self.genres], dtype=np.float32)
+        affinity = self.genre_features @ weights
+        scores = np.where(affinity > 0, affinity + self.quality, -np.inf)
+        candidates = int(np.count_nonzero(affinity > 0))
+        k = min(k, candidates)
+        if k == 0:
+            return []
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [self.movies[i] for i in top]
+
+
+class BlendedRanker:
+    """
+    Maps emotion scores to genre weights and keeps the RankingIndex for the
+    current genre lists, rebuilding it only when a different list object
+    turns up (the cache hands out the same object until it refreshes).
+    """
+
+    def __init__(self, emotion_to_genre, shape, max_results=60, quality_weights=(0.3, 0.15, 0.1)):
+        self.emotion_to_genre = dict(emotion_to_genre)
+        self.genres = tuple(sorted(set(self.emotion_to_genre.values())))
+        self.shape = shape
+        self.max_results = max_results
+        self.quality_weights = tuple(quality_weights)
+        self._sources = None
+        self._index = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def genre_weights(self, scores):
+        weights = {}
+        for emotion, score in scores.items():
+            genre = self.emotion_to_genre.get(emotion)
+            if genre is not None:
+                weights[genre] = weights.get(genre, 0.0) + score
+        return weights
+
+    def index(self, lists):
+        """The RankingIndex for ``lists`` ({genre: cached movie list})."""
+        sources = tuple(lists.get(genre) for genre in self.genres)
+        with self._lock:
+            index = self._index
+            if index is not None and all(a is b for a, b in zip(sources, self._sources)):
+                return index
+        with metrics.timed('get_movies', 'blend_build'):
+            index = RankingIndex(self.genres, dict(zip(self.genres, sources)), self.shape, self.quality_weights)
+        with self._lock:
+            # Holding the sources keeps the identity check safe from id() reuse.
+            self._sources = sources
+            self._index = index
+            self.builds += 1
+        return index
+
+    def rank(self, index, scores):
+        """Shaped movies from ``index`` for a normalized {emotion: score} mapping, best first."""
+        with metrics.timed('get_movies', 'blend_rank'):
+            return index.rank(self.genre_weights(scores), self.max_results)
+
+    def stats(self):
+        index = self._index
+        return {'builds': self.builds, 'indexed_movies': len(index) if index is not None else 0}
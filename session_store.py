@@ -0,0 +1,103 @@
+import secrets
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+
+
+class SQLiteSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """
+    Server-side sessions in a ``sessions`` table of a cache_store.CacheDatabase,
+    so every worker and instance sharing the database sees the same sessions.
+
+    The cookie holds only a signed random session id. A request that doesn't
+    change the session reads one row by primary key and writes nothing,
+    unless its row is past half of ``ttl``, when the expiry is pushed out.
+    Expired rows are never served and are removed by ``sweep()``, which uses
+    the index on ``expires_at``.
+    """
+
+    serializer = TaggedJSONSerializer()
+    salt = 'sqlite-session'
+
+    def __init__(self, db, ttl=7 * 24 * 3600):
+        self.db = db
+        self.ttl = int(ttl)
+
+    def create_table(self):
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT,
+                expires_at INTEGER
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)')
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie and app.secret_key:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                row = self.db.execute('SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at >= ?',
+                                      (sid, int(time.time()))).fetchone()
+                if row is not None:
+                    return SQLiteSession(self.serializer.loads(row[0]), sid=sid, expires_at=row[1])
+        return SQLiteSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified:
+                if not session.new:
+                    self.db.execute('DELETE FROM sessions WHERE id = ?', (session.sid,))
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        now = int(time.time())
+        renew = session.expires_at is None or session.expires_at - now < self.ttl // 2
+        if not (session.modified or renew):
+            return
+        if session.modified:
+            self.db.execute('''
+                INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+            ''', (session.sid, self.serializer.dumps(dict(session)), now + self.ttl))
+        else:
+            self.db.execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (now + self.ttl, session.sid))
+
+        if session.new or session.modified or self.should_set_cookie(app, session):
+            response.set_cookie(name, self._signer(app).sign(session.sid).decode(),
+                                expires=self.get_expiration_time(app, session), httponly=httponly,
+                                domain=domain, path=path, secure=secure, samesite=samesite)
+            response.vary.add('Cookie')
+
+    def sweep(self):
+        """Delete expired sessions; returns how many."""
+        return self.db.execute('DELETE FROM sessions WHERE expires_at < ?', (int(time.time()),)).rowcount
@@ -0,0 +1,144 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one: the first caller
+    runs ``fn`` and everyone who asks for that key meanwhile waits for it and
+    gets the same result (or exception).
+
+    With a ``lock`` (see SQLiteFlightLock) the leader also coordinates with
+    other worker processes. If another process holds the key, it waits for
+    that process to finish and then calls ``reuse()`` to pick up what it
+    stored, and only calls ``fn`` itself if nothing turned up.
+    """
+
+    def __init__(self, lock=None, wait_timeout=10.0):
+        self.lock = lock
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._mutex = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+        self.shared_across_workers = 0
+
+    def do(self, key, fn, reuse=None):
+        with self._mutex:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._run(key, fn, reuse)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._mutex:
+                del self._calls[key]
+            call.done.set()
+
+    def _run(self, key, fn, reuse):
+        if self.lock is None:
+            return fn()
+        if self.lock.acquire(key):
+            try:
+                return fn()
+            finally:
+                self.lock.release(key)
+
+        self.lock.wait(key, self.wait_timeout)
+        if reuse is not None:
+            value = reuse()
+            if value:
+                with self._mutex:
+                    self.shared_across_workers += 1
+                return value
+        return fn()
+
+    def stats(self):
+        with self._mutex:
+            return {
+                'upstream_calls': self.leaders,
+                'coalesced': self.shared,
+                'coalesced_across_workers': self.shared_across_workers,
+                'in_flight': len(self._calls),
+            }
+
+
+class SQLiteFlightLock:
+    """
+    Advisory per-key lock stored as a row in the ``flight_locks`` table of a
+    cache_store.CacheDatabase, so gunicorn workers sharing the cache can tell
+    one another they are already fetching a key. Rows expire after ``ttl``
+    seconds in case their owner dies mid-fetch.
+    """
+
+    def __init__(self, db, namespace, ttl=30, poll_interval=0.05):
+        self.db = db
+        self.namespace = namespace
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+    def _row_key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def _owner(self):
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    def acquire(self, key):
+        now = time.time()
+        try:
+            self.db.execute('DELETE FROM flight_locks WHERE key = ? AND expires_at < ?', (self._row_key(key), now))
+            cursor = self.db.execute(
+                'INSERT OR IGNORE INTO flight_locks (key, owner, expires_at) VALUES (?, ?, ?)',
+                (self._row_key(key), self._owner(), now + self.ttl))
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            # Without the lock table we still coalesce within this worker.
+            logger.error("Error acquiring fetch lock", extra={'event': 'fetch_lock_failed', 'error': str(e)})
+            return True
+
+    def release(self, key):
+        try:
+            self.db.execute('DELETE FROM flight_locks WHERE key = ? AND owner = ?', (self._row_key(key), self._owner()))
+        except sqlite3.Error as e:
+            logger.error("Error releasing fetch lock", extra={'event': 'fetch_lock_failed', 'error': str(e)})
+
+    def wait(self, key, timeout):
+        """Block until nobody holds ``key`` (or its row expired), at most ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                row = self.db.execute(
+                    'SELECT 1 FROM flight_locks WHERE key = ? AND expires_at >= ?',
+                    (self._row_key(key), time.time())).fetchone()
+            except sqlite3.Error:
+                return
+            if row is None:
+                return
+            time.sleep(self.poll_interval)
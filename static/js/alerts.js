@@ -0,0 +1,10 @@
+document.addEventListener('click', function(e){
+  var btn = e.target.closest('button.close');
+  if(btn){
+    var alert = btn.parentElement;
+    if(alert) alert.style.display = 'none';
+  }
+});
+setTimeout(function(){
+  document.querySelectorAll('.alert').forEach(function(a){ a.style.display = 'none'; });
+}, 5000);
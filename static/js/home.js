@@ -0,0 +1,377 @@
+const MOVIES_PAGE_SIZE = 12;
+let movieListGeneration = 0;
+let loadMoreMovies = null;
+
+// Reads an NDJSON movie list and hands each movie to onMovie as soon as
+// its line arrives, so the first posters show before the rest is sent.
+// Resolves to the cursor for the next page, or null.
+async function streamMovies(url, onMovie) {
+    const response = await fetch(url, { headers: { 'Accept': 'application/x-ndjson' } });
+    if (!response.ok) {
+        throw new Error(`Movie request failed with status ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    let nextCursor = null;
+    const handleLine = (line) => {
+        if (!line.trim()) return;
+        const item = JSON.parse(line);
+        if ('next_cursor' in item) {
+            nextCursor = item.next_cursor;
+        } else {
+            onMovie(item);
+        }
+    };
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        lines.forEach(handleLine);
+    }
+    handleLine(buffered + decoder.decode());
+    return nextCursor;
+}
+
+// Replaces the movie list with the first page from url (/get_movies or
+// /search_movie); "Show more" loads the following pages.
+async function showMovies(url, renderMovie, emptyMessage) {
+    const movieList = document.getElementById('movie-list');
+    const loadMoreBtn = document.getElementById('load-more-btn');
+    const generation = ++movieListGeneration;
+    movieList.innerHTML = '';
+    loadMoreBtn.hidden = true;
+    loadMoreMovies = null;
+    let shown = 0;
+
+    const loadPage = async (cursor) => {
+        let pageUrl = `${url}&format=ndjson&limit=${MOVIES_PAGE_SIZE}`;
+        if (cursor) pageUrl += `&cursor=${encodeURIComponent(cursor)}`;
+        const nextCursor = await streamMovies(pageUrl, movie => {
+            if (generation !== movieListGeneration) return;
+            movieList.appendChild(renderMovie(movie));
+            shown += 1;
+        });
+        if (generation !== movieListGeneration) return;
+        loadMoreMovies = nextCursor ? () => loadPage(nextCursor) : null;
+        loadMoreBtn.hidden = !nextCursor;
+        if (!shown && emptyMessage) {
+            movieList.innerHTML = `<p>${emptyMessage}</p>`;
+        }
+    };
+    await loadPage(null);
+}
+
+function renderRecommendedMovie(movie) {
+    const li = document.createElement('li');
+    li.innerHTML = `
+        <img src="${movie.primaryImage || 'placeholder.jpg'}" alt="${movie.primaryTitle}" loading="lazy">
+        <div class="movie-overlay">
+            <h3>${movie.primaryTitle}</h3>
+            <p>${movie.description || 'No description available.'}</p>
+            ${movie.trailerUrl ? `<a href="${movie.trailerUrl}" target="" class="explore-button">Watch Trailer</a>` : ''}
+        </div>
+    `;
+    return li;
+}
+
+function renderSearchResult(movie) {
+    const li = document.createElement('li');
+    li.innerHTML = `
+        <img src="${movie.primaryImage || 'placeholder.jpg'}" alt="${movie.primaryTitle}" loading="lazy">
+        <h3>${movie.primaryTitle}</h3>
+        <p>${movie.description || 'No description available.'}</p>
+        ${movie.trailerUrl ? `<a href="${movie.trailerUrl}" target="" class="explore-button">Watch Trailer</a>` : ''}
+    `;
+    return li;
+}
+
+document.getElementById('load-more-btn').addEventListener('click', async (event) => {
+    if (!loadMoreMovies) return;
+    event.target.disabled = true;
+    try {
+        await loadMoreMovies();
+    } catch (error) {
+        console.error('Error loading more movies:', error);
+    } finally {
+        event.target.disabled = false;
+    }
+});
+
+document.addEventListener('DOMContentLoaded', () => {
+    const video = document.getElementById('video');
+    const captureBtn = document.getElementById('capture-btn');
+    const liveBtn = document.getElementById('live-btn');
+    const cameraToggleSwitchInput = document.getElementById('camera-toggle-switch-input');
+    const searchInput = document.getElementById('search-query');
+    const voiceSearchBtn = document.getElementById('voice-search-btn');
+    const emotionPopup = document.getElementById('emotion-popup');
+
+    let detectedEmotion = '';
+    let mediaStream = null;
+    let cameraEnabled = false; // Camera starts OFF
+    let liveSocket = null;
+    let liveTimer = null;
+
+    // Captures are sent as small raw grayscale buffers instead of full-size JPEGs
+    const RAW_CAPTURE = true;
+    const RAW_CAPTURE_WIDTH = 320;
+
+    // Set initial camera OFF state
+    cameraToggleSwitchInput.checked = false;
+    captureBtn.disabled = true;
+    captureBtn.style.opacity = '0.5';
+    liveBtn.disabled = true;
+    liveBtn.style.opacity = '0.5';
+
+    // Camera toggle functionality with switch
+    cameraToggleSwitchInput.addEventListener('change', () => {
+        if (cameraToggleSwitchInput.checked) {
+            // Turn on camera
+            navigator.mediaDevices.getUserMedia({ video: true })
+                .then(stream => {
+                    video.srcObject = stream;
+                    mediaStream = stream;
+                    cameraEnabled = true;
+                    captureBtn.disabled = false;
+                    captureBtn.style.opacity = '1';
+                    liveBtn.disabled = false;
+                    liveBtn.style.opacity = '1';
+                })
+                .catch(err => {
+                    console.error("Error accessing the camera: ", err);
+                    alert('Failed to access camera. Please check permissions.');
+                    cameraToggleSwitchInput.checked = false;
+                });
+        } else {
+            // Turn off camera
+            stopLiveMood();
+            liveBtn.disabled = true;
+            liveBtn.style.opacity = '0.5';
+            if (mediaStream) {
+                mediaStream.getTracks().forEach(track => track.stop());
+            }
+            video.srcObject = null;
+            cameraEnabled = false;
+            captureBtn.disabled = true;
+            captureBtn.style.opacity = '0.5';
+        }
+    });
+
+    // Capture face and detect emotion
+    captureBtn.addEventListener('click', async () => {
+        if (!cameraEnabled) {
+            alert('Camera is turned off. Please enable the camera to capture faces.');
+            return;
+        }
+        try {
+            const formData = new FormData();
+            const canvas = document.createElement('canvas');
+            const ctx = canvas.getContext('2d');
+
+            if (RAW_CAPTURE) {
+                // Downscale on the client and send raw grayscale pixels; the server skips JPEG decoding
+                const scale = Math.min(1, RAW_CAPTURE_WIDTH / video.videoWidth);
+                canvas.width = Math.round(video.videoWidth * scale);
+                canvas.height = Math.round(video.videoHeight * scale);
+                ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+
+                const rgba = ctx.getImageData(0, 0, canvas.width, canvas.height).data;
+                const gray = new Uint8Array(canvas.width * canvas.height);
+                for (let i = 0, j = 0; i < gray.length; i++, j += 4) {
+                    gray[i] = (rgba[j] * 77 + rgba[j + 1] * 150 + rgba[j + 2] * 29) >> 8;
+                }
+                formData.append('raw', new Blob([gray]), 'face.raw');
+                formData.append('width', canvas.width);
+                formData.append('height', canvas.height);
+                formData.append('channels', 1);
+                await sendCapture(formData);
+            } else {
+                canvas.width = video.videoWidth;
+                canvas.height = video.videoHeight;
+                ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+
+                canvas.toBlob(async (blob) => {
+                    formData.append('image', blob, 'face.jpg');
+                    await sendCapture(formData);
+                }, 'image/jpeg', 0.85);
+            }
+        } catch (error) {
+            console.error('Error detecting emotion:', error);
+        }
+    });
+
+    async function sendCapture(formData) {
+        const response = await fetch('/detect_emotion', { method: 'POST', body: formData });
+        const data = await response.json();
+
+        if (data.success) {
+            detectedEmotion = data.emotion;
+            showEmotionPopup(detectedEmotion);
+            fetchMovies(detectedEmotion, data.scores);
+        }
+    }
+
+    // Live mood: stream small frames over a websocket and show the smoothed emotion
+    function stopLiveMood() {
+        if (liveTimer) {
+            clearInterval(liveTimer);
+            liveTimer = null;
+        }
+        if (liveSocket) {
+            liveSocket.close();
+            liveSocket = null;
+        }
+        liveBtn.classList.remove('live');
+        liveBtn.innerText = 'Live Mood';
+    }
+
+    function startLiveMood() {
+        const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${protocol}://${window.location.host}/emotion_stream`);
+        const canvas = document.createElement('canvas');
+        canvas.width = 320;
+        canvas.height = 240;
+        const ctx = canvas.getContext('2d');
+        let liveEmotion = '';
+
+        socket.onopen = () => {
+            liveTimer = setInterval(() => {
+                // Skip a tick rather than queueing frames the server will drop anyway
+                if (socket.readyState !== WebSocket.OPEN || socket.bufferedAmount > 0) {
+                    return;
+                }
+                ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+                canvas.toBlob((blob) => {
+                    if (blob && socket.readyState === WebSocket.OPEN) {
+                        socket.send(blob);
+                    }
+                }, 'image/jpeg', 0.7);
+            }, 200);
+        };
+        socket.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            if (!data.face || !data.emotion) {
+                return;
+            }
+            liveBtn.innerText = `Live: ${data.emotion}`;
+            if (data.emotion !== liveEmotion) {
+                liveEmotion = data.emotion;
+                detectedEmotion = data.emotion;
+                fetchMovies(detectedEmotion, data.emotion_scores);
+            }
+        };
+        socket.onclose = () => {
+            if (liveSocket === socket) {
+                stopLiveMood();
+            }
+        };
+
+        liveSocket = socket;
+        liveBtn.classList.add('live');
+        liveBtn.innerText = 'Live: ...';
+    }
+
+    liveBtn.addEventListener('click', () => {
+        if (!cameraEnabled) {
+            alert('Camera is turned off. Please enable the camera to track your mood.');
+            return;
+        }
+        if (liveSocket) {
+            stopLiveMood();
+        } else {
+            startLiveMood();
+        }
+    });
+
+    // Show detected emotion prompt
+    function showEmotionPopup(emotion) {
+        const popup = emotionPopup; // Assuming emotionPopup is defined globally
+
+        popup.innerText = `😊 Emotion Detected: ${emotion}`;
+        popup.style.opacity = '0'; // Reset before showing
+        popup.style.display = 'block';
+
+        // Trigger reflow to ensure the opacity reset is acknowledged
+        void popup.offsetWidth;
+
+        popup.style.transition = 'opacity 0.5s ease';
+        popup.style.opacity = '1'; // Fade in
+
+        setTimeout(() => {
+            popup.style.opacity = '0'; // Fade out
+            setTimeout(() => {
+                popup.style.display = 'none';
+            }, 500); // Matches transition duration
+        }, 2000);
+    }
+
+
+    // Fetch movies based on emotion; with the full score vector the
+    // server blends the genres of every detected emotion.
+    async function fetchMovies(emotion, scores) {
+        let url = `/get_movies?emotion=${encodeURIComponent(emotion)}`;
+        if (scores && Object.keys(scores).length) {
+            const spec = Object.entries(scores).map(([label, score]) => `${label}:${score}`).join(',');
+            url += `&scores=${encodeURIComponent(spec)}`;
+        }
+        try {
+            await showMovies(url, renderRecommendedMovie);
+        } catch (error) {
+            console.error('Error fetching movies:', error);
+        }
+    }
+
+    // Smooth scroll to top on "Home" button click
+    document.getElementById('home-button').addEventListener('click', (event) => {
+        event.preventDefault();
+        window.scrollTo({ top: 0, behavior: 'smooth' });
+    });
+
+    // Voice search animation
+    function startVoiceSearch() {
+        const recognition = new (window.SpeechRecognition || window.webkitSpeechRecognition)();
+        recognition.lang = 'en-US';
+
+        voiceSearchBtn.classList.add('recording'); // Start animation
+
+        recognition.onresult = (event) => {
+            const transcript = event.results[0][0].transcript;
+            searchInput.value = transcript;
+            voiceSearchBtn.classList.remove('recording'); // Stop animation
+
+            // Trigger search after voice input
+            performSearch(transcript); // Replace with your actual search function or form submit
+        };
+
+        recognition.onerror = () => {
+            voiceSearchBtn.classList.remove('recording'); // Stop animation on error
+        };
+
+        recognition.start();
+    }
+
+    voiceSearchBtn.addEventListener('click', startVoiceSearch);
+
+});
+
+document.getElementById('search-btn').addEventListener('click', async () => {
+    const searchQuery = document.getElementById('search-query').value.trim();
+    if (!searchQuery) {
+        alert('Please enter a movie name to search!');
+        return;
+    }
+
+    try {
+        await showMovies(
+            `/search_movie?query=${encodeURIComponent(searchQuery)}`,
+            renderSearchResult,
+            'No movies found for your search.'
+        );
+    } catch (error) {
+        console.error('Error searching movies:', error);
+        alert('An error occurred while searching.');
+    }
+});
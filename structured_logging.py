@@ -0,0 +1,152 @@
+"""
+Logging set-up: one JSON object per line (or plain text), written by a
+background thread so request threads only put records on a queue.
+
+Modules log with ``logging.getLogger(__name__)`` and name what happened in
+``extra``, e.g. ``logger.info("RapidAPI response", extra={'event':
+'rapidapi_response', 'status': 200})``; the other ``extra`` keys become
+fields of the JSON line. Events listed in LOG_SAMPLE_RATES are kept with that
+probability (warnings and errors always are), and when the queue is full
+records are dropped rather than making the caller wait.
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came in through ``extra``.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a ``rates[event]`` fraction of records per event; warnings and errors always pass."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, 'event', None), 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class AsyncHandler(QueueHandler):
+    """
+    Puts records on a bounded queue that a QueueListener thread writes to
+    ``target``. A process forked after the handler was set up (a gunicorn
+    worker under preload_app) starts its own queue and thread on first use.
+    """
+
+    def __init__(self, target, max_queue=10000):
+        super().__init__(queue.Queue(max_queue))
+        self.target = target
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Whatever the parent left on its queue is its own to write.
+            self.queue = queue.Queue(self.max_queue)
+            self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.flush_and_stop)
+
+    def prepare(self, record):
+        # Formatting (including any large ``extra`` values) is left to the
+        # listener thread; records never leave the process.
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush_and_stop(self):
+        """Write out what is queued and stop the listener thread."""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+_handler = None
+
+
+def parse_sample_rates(spec):
+    """``"event=0.1,other=0.5"`` -> {"event": 0.1, "other": 0.5}"""
+    rates = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            event, rate = item.split('=', 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+def logging_options(config):
+    """configure_logging() keyword arguments from the config module."""
+    return {
+        'level': config.LOG_LEVEL,
+        'json_format': config.LOG_FORMAT == 'json',
+        'sample_rates': parse_sample_rates(config.LOG_SAMPLE_RATES),
+        'max_queue': config.LOG_QUEUE_SIZE,
+    }
+
+
+def configure_logging(level='INFO', json_format=True, sample_rates=None, max_queue=10000):
+    """Route the root logger through an AsyncHandler to stdout. Calling it again changes nothing."""
+    global _handler
+    if _handler is not None:
+        return _handler
+    target = logging.StreamHandler(sys.stdout)
+    if json_format:
+        target.setFormatter(JsonFormatter())
+    else:
+        target.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler = AsyncHandler(target, max_queue=max_queue)
+    handler.addFilter(SamplingFilter(sample_rates or {}))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    _handler = handler
+    return handler
+
+
+def stats():
+    if _handler is None:
+        return None
+    return {'queued': _handler.queue.qsize(), 'dropped': _handler.dropped}
@@ -0,0 +1,267 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TieredCache:
+    """
+    Bounded in-process LRU in front of a persistent cache and the origin.
+
+    An entry younger than ``soft_ttl`` seconds is served as is. Between
+    ``soft_ttl`` and ``hard_ttl`` it is still served, but a background
+    refresh is started (stale-while-revalidate). An older entry counts as
+    missing, and the caller waits for ``fetch``.
+
+    ``load(key)`` returns ``(value, stored_at)`` from the persistent tier or
+    None. ``store(key, value)`` writes to that tier. ``fetch(key)`` asks the
+    origin and returns a falsy value on failure, so nothing is cached.
+    Cached values are shared between callers and must not be mutated.
+
+    With a ``flight`` (single_flight.SingleFlight), concurrent misses and
+    refreshes of one key share a single fetch.
+
+    Negative results are remembered for ``negative_ttl`` seconds, during
+    which a stale entry for the key is served without another refresh. An
+    empty value is returned as is. A failed fetch (``fetch`` returned None) falls
+    back to the last known good value for the key, however old, from memory
+    or the persistent tier.
+
+    ``on_event(name)``, if given, is called for every counted event ("hit",
+    "persistent_hit", "miss", "stale", "negative_hit", "fallback",
+    "refresh_error"), e.g. to export the counters as metrics.
+    """
+
+    def __init__(self, fetch, load=None, store=None, max_entries=128, soft_ttl=3600, hard_ttl=86400,
+                 flight=None, negative_ttl=30, on_event=None):
+        self.fetch = fetch
+        self.on_event = on_event
+        self.load = load
+        self.store = store
+        self.flight = flight
+        self.max_entries = max_entries
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = max(hard_ttl, soft_ttl)
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._negative = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.refresh_errors = 0
+        self.negative_hits = 0
+        self.fallbacks = 0
+
+    def _event(self, name):
+        if self.on_event is not None:
+            self.on_event(name)
+
+    def get(self, key):
+        now = time.time()
+        entry = self._get_memory(key, now)
+        if entry is None:
+            negative = self._get_negative(key, now)
+            if negative is not None:
+                self._event('negative_hit')
+                return negative[0]
+            entry = self._get_persistent(key, now)
+            if entry is not None:
+                self._event('persistent_hit')
+        else:
+            self._event('hit')
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            self._event('miss')
+            return self._fetch(key)[0]
+
+        value, stored_at = entry
+        if now - stored_at >= self.soft_ttl:
+            with self._lock:
+                self.stale += 1
+            self._event('stale')
+            # A refresh that failed within negative_ttl isn't retried yet.
+            if not self._refresh_failed_recently(key, now):
+                self._refresh_in_background(key)
+        return value
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if now - entry[1] >= self.hard_ttl:
+                # Kept as the last known good value until replaced or evicted.
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _get_negative(self, key, now):
+        with self._lock:
+            entry = self._negative.get(key)
+            if entry is None:
+                return None
+            if now >= entry[1]:
+                del self._negative[key]
+                return None
+            self.negative_hits += 1
+            return entry
+
+    def _refresh_failed_recently(self, key, now):
+        with self._lock:
+            entry = self._negative.get(key)
+        return entry is not None and now < entry[1]
+
+    def _remember_negative(self, key, value):
+        with self._lock:
+            self._negative[key] = (value, time.time() + self.negative_ttl)
+            self._negative.move_to_end(key)
+            while len(self._negative) > self.max_entries:
+                self._negative.popitem(last=False)
+
+    def _last_known_good(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry[0]
+        row = self.load(key) if self.load is not None else None
+        if row and row[0]:
+            self._remember(key, row[0], row[1])
+            return row[0]
+        return None
+
+    def _get_persistent(self, key, now):
+        if self.load is None:
+            return None
+        row = self.load(key)
+        if not row or not row[0] or now - row[1] >= self.hard_ttl:
+            return None
+        self._remember(key, row[0], row[1])
+        with self._lock:
+            self.persistent_hits += 1
+        return row
+
+    def _remember(self, key, value, stored_at):
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        with self._lock:
+            self._negative.pop(key, None)
+        self._remember(key, value, time.time())
+        if self.store is not None:
+            self.store(key, value)
+
+    def _fetch_and_put(self, key):
+        """Returns (value, fetched): on failure the value is the last known good one, if any."""
+        value = self.fetch(key)
+        if value:
+            self.put(key, value)
+            return value, True
+        fetched = value is not None
+        if not fetched:
+            value = self._last_known_good(key)
+            if value:
+                with self._lock:
+                    self.fallbacks += 1
+                self._event('fallback')
+        self._remember_negative(key, value)
+        return value, fetched
+
+    def _reuse_fresh(self, key):
+        """A value another worker just stored in the persistent tier, in _fetch_and_put's form, if any."""
+        row = self.load(key) if self.load is not None else None
+        if not row or not row[0] or time.time() - row[1] >= self.soft_ttl:
+            return None
+        self._remember(key, row[0], row[1])
+        return row[0], True
+
+    def _fetch(self, key):
+        if self.flight is None:
+            return self._fetch_and_put(key)
+        return self.flight.do(key, lambda: self._fetch_and_put(key), reuse=lambda: self._reuse_fresh(key))
+
+    def refresh(self, key):
+        """Fetch ``key`` from the origin now (sharing any in-flight fetch) and cache it."""
+        value, fetched = self._fetch(key)
+        return value if fetched else None
+
+    def expires_in(self, key):
+        """Seconds until ``key`` goes stale (negative once it has), or None if it isn't cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.load is not None:
+            row = self.load(key)
+            if row and row[0]:
+                self._remember(key, row[0], row[1])
+                entry = row
+        if entry is None:
+            return None
+        return entry[1] + self.soft_ttl - time.time()
+
+    def contains(self, key):
+        """True if get(key) would answer without waiting for ``fetch``: a fresh, stale or negative entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            negative = self._negative.get(key)
+        if entry is not None and now - entry[1] < self.hard_ttl:
+            return True
+        if negative is not None and now < negative[1]:
+            return True
+        row = self.load(key) if self.load is not None else None
+        return bool(row and row[0] and now - row[1] < self.hard_ttl)
+
+    def _refresh_in_background(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key,), name='cache-refresh', daemon=True).start()
+
+    def _refresh(self, key):
+        try:
+            _, fetched = self._fetch(key)
+            if not fetched:
+                with self._lock:
+                    self.refresh_errors += 1
+                self._event('refresh_error')
+        except Exception as e:
+            logger.error("Cache refresh failed", extra={'event': 'cache_refresh_failed', 'key': key, 'error': str(e)})
+            self._remember_negative(key, self._last_known_good(key))
+            with self._lock:
+                self.refresh_errors += 1
+            self._event('refresh_error')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'refreshing': len(self._refreshing),
+                'refresh_errors': self.refresh_errors,
+                'negative_entries': len(self._negative),
+                'negative_hits': self.negative_hits,
+                'fallbacks': self.fallbacks,
+                'hit_ratio': round((self.hits + self.persistent_hits) / lookups, 3) if lookups else 0.0,
+                'soft_ttl': self.soft_ttl,
+                'hard_ttl': self.hard_ttl,
+                'single_flight': self.flight.stats() if self.flight is not None else None,
+            }
@@ -0,0 +1,135 @@
+import difflib
+import json
+import re
+import time
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def title_key(title):
+    return ' '.join(_WORD.findall(title.lower()))
+
+
+class TitleIndex:
+    """
+    Full-text index (SQLite FTS5) of every movie we have fetched, used to
+    answer title autocomplete without calling RapidAPI.
+
+    ``movie_titles`` holds one row per title with the movie as served to the
+    client, and ``movie_titles_fts`` indexes the titles (external content
+    kept in sync by triggers, with 2- and 3-character prefix indexes).
+    ``search`` matches every word of the query as a word prefix and, when
+    that finds too little, also fuzzy matches the whole title.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def create(self):
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS movie_titles (
+                id INTEGER PRIMARY KEY,
+                title_key TEXT UNIQUE,
+                title TEXT,
+                movie TEXT,
+                updated_at INTEGER
+            )
+        ''')
+        self.db.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS movie_titles_fts USING fts5(
+                title, content='movie_titles', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS movie_titles_ai AFTER INSERT ON movie_titles BEGIN
+                INSERT INTO movie_titles_fts (rowid, title) VALUES (new.id, new.title);
+            END
+        ''')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS movie_titles_ad AFTER DELETE ON movie_titles BEGIN
+                INSERT INTO movie_titles_fts (movie_titles_fts, rowid, title) VALUES ('delete', old.id, old.title);
+            END
+        ''')
+        self.db.execute('''
+            CREATE TRIGGER IF NOT EXISTS movie_titles_au AFTER UPDATE ON movie_titles BEGIN
+                INSERT INTO movie_titles_fts (movie_titles_fts, rowid, title) VALUES ('delete', old.id, old.title);
+                INSERT INTO movie_titles_fts (rowid, title) VALUES (new.id, new.title);
+            END
+        ''')
+
+    def is_empty(self):
+        return self.db.execute('SELECT 1 FROM movie_titles LIMIT 1').fetchone() is None
+
+    def add(self, movies):
+        """Index movies shaped like /search_movie results; returns how many were written."""
+        rows = [(title_key(movie['primaryTitle']), movie['primaryTitle'], json.dumps(movie), int(time.time()))
+                for movie in movies if movie and movie.get('primaryTitle')]
+        rows = [row for row in rows if row[0]]
+        if not rows:
+            return 0
+        conn = self.db.connection()
+        # Take the write lock up front: a deferred transaction that reads
+        # before writing can't wait on busy_timeout and fails "database is locked".
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('''
+                INSERT INTO movie_titles (title_key, title, movie, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(title_key) DO UPDATE SET
+                    title = excluded.title, movie = excluded.movie, updated_at = excluded.updated_at
+            ''', rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(rows)
+
+    def trim(self, max_titles):
+        """Forget the least recently fetched titles beyond ``max_titles``; returns how many."""
+        return self.db.execute('''
+            DELETE FROM movie_titles WHERE id IN (
+                SELECT id FROM movie_titles ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (max_titles,)).rowcount
+
+    def search(self, query, limit=25, min_results=5, fuzzy_cutoff=0.75):
+        """
+        (matches, fuzzy): titles with every query word as a word prefix, and,
+        only when there are fewer than ``min_results`` of those, titles close
+        to the query (typos) to fill up to ``limit``.
+        """
+        key = title_key(query)
+        if not key:
+            return [], []
+        words = key.split()
+        match = ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+        rows = self.db.execute('''
+            SELECT movie_titles.title_key, movie_titles.movie FROM movie_titles_fts
+            JOIN movie_titles ON movie_titles.id = movie_titles_fts.rowid
+            WHERE movie_titles_fts MATCH ?
+            ORDER BY substr(movie_titles.title_key, 1, ?) = ? DESC, bm25(movie_titles_fts), length(movie_titles.title)
+            LIMIT ?
+        ''', (match, len(key), key, limit)).fetchall()
+        found = [json.loads(movie) for _, movie in rows]
+        fuzzy = []
+        if len(found) < min_results:
+            seen = {row[0] for row in rows}
+            fuzzy = [movie for movie in self._fuzzy(key, limit - len(found), fuzzy_cutoff)
+                     if title_key(movie['primaryTitle']) not in seen]
+        return found, fuzzy
+
+    def _fuzzy(self, key, limit, cutoff):
+        """Titles close to ``key`` (typos), among those sharing its first letter."""
+        candidates = dict(self.db.execute(
+            'SELECT title_key, movie FROM movie_titles WHERE substr(title_key, 1, 1) = ? LIMIT 5000',
+            (key[0],)).fetchall())
+        # Compare against the start of each title so a typed prefix can still match.
+        prefixes = {}
+        for candidate in candidates:
+            prefixes.setdefault(candidate[:len(key)], []).append(candidate)
+        matches = difflib.get_close_matches(key, list(prefixes), n=limit, cutoff=cutoff)
+        results = []
+        for prefix in matches:
+            for candidate in prefixes[prefix]:
+                results.append(json.loads(candidates[candidate]))
+        return results[:limit]
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordCheckBusy(Exception):
+    """Raised when the password hashing pool cannot take more work; callers should answer 503."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a small thread pool, so a burst
+    of logins queues here instead of tying up every request thread. At most
+    ``max_workers + max_queue`` calls may be outstanding; past that, or after
+    waiting ``timeout`` seconds, callers get PasswordCheckBusy.
+    """
+
+    def __init__(self, max_workers=2, max_queue=8, timeout=5.0, retry_after=1):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_executor(self):
+        # Executor threads don't survive a fork, so every gunicorn worker gets its own.
+        if self._executor is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hash')
+            self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+            self._pid = os.getpid()
+
+    def _run(self, fn, *args):
+        self._ensure_executor()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise PasswordCheckBusy("Too many logins in progress", self.retry_after)
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PasswordCheckBusy("Password check timed out", self.retry_after)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+
+class UserStore:
+    """
+    Local accounts in an SQLite ``users`` table (see cache_store.CacheDatabase
+    for the connection handling), looked up through a unique index on email.
+
+    ``create`` is a single INSERT, so two workers registering the same email
+    can't both succeed and nothing is rewritten; ``migrate_json`` imports a
+    legacy users.json ({email: password_hash}) once and renames it aside.
+    """
+
+    def __init__(self, db, hasher=None):
+        self.db = db
+        self.hasher = hasher or PasswordHasher()
+
+    def create_table(self):
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                email TEXT NOT NULL,
+                password_hash TEXT NOT NULL,
+                created_at INTEGER
+            )
+        ''')
+        self.db.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users (email)')
+
+    def migrate_json(self, path):
+        """
+        Import users from the JSON file at ``path``, keeping any account that
+        already exists, then rename the file to ``<path>.migrated``. Returns
+        how many users were added (0 when there is no file, e.g. because
+        another worker got to it first).
+        """
+        try:
+            with open(path, 'r') as f:
+                users = json.load(f)
+        except FileNotFoundError:
+            return 0
+        now = int(time.time())
+        rows = [(email, password_hash, now) for email, password_hash in users.items()]
+        conn = self.db.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            added = conn.executemany(
+                'INSERT OR IGNORE INTO users (email, password_hash, created_at) VALUES (?, ?, ?)', rows).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        try:
+            os.replace(path, path + '.migrated')
+        except FileNotFoundError:
+            pass
+        return max(added, 0)
+
+    def password_hash(self, email):
+        row = self.db.execute('SELECT password_hash FROM users WHERE email = ?', (email,)).fetchone()
+        return row[0] if row else None
+
+    def exists(self, email):
+        return self.password_hash(email) is not None
+
+    def create(self, email, password):
+        """Add a user; returns False if the email is already taken."""
+        if self.exists(email):
+            return False
+        password_hash = self.hasher.hash(password)
+        try:
+            self.db.execute('INSERT INTO users (email, password_hash, created_at) VALUES (?, ?, ?)',
+                            (email, password_hash, int(time.time())))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def validate(self, email, password):
+        """
+        True if ``password`` matches the stored hash. Raises
+        PasswordCheckBusy when the hashing pool is saturated.
+        """
+        password_hash = self.password_hash(email)
+        if password_hash is None:
+            return False
+        return self.hasher.verify(password_hash, password)